@@ -0,0 +1,33 @@
+"""
+Microbenchmark for destination name resolution.
+
+    python benchmarks/destination_lookup.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mapping
+import catalog
+
+CASES = [
+    ("dict.get (old exact path)", lambda: mapping.destination_mapping.get("Paris")),
+    ("exact", lambda: catalog.current().destinations.resolve("Paris")),
+    ("normalized", lambda: catalog.current().destinations.resolve("  kraków ")),
+    ("alias", lambda: catalog.current().destinations.resolve("Lisboa")),
+    ("fuzzy", lambda: catalog.current().destinations.resolve("Barcelonna")),
+    ("miss", lambda: catalog.current().destinations.resolve("Tokyo"))
+]
+
+
+def main():
+    number = 100000
+    for name, call in CASES:
+        seconds = min(timeit.repeat(call, number=number, repeat=5))
+        print(f"{name:<28} {seconds / number * 1e6:8.2f} us/lookup   -> {call()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Compare full-body parsing with incremental parsing of a large offers response.
+
+Each mode runs in its own subprocess so peak RSS is measured independently:
+
+    python benchmarks/offer_parsing.py --offers 50000
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNK_SIZE = 64 * 1024
+
+
+def write_document(path: str, offers: int):
+    random.seed(1)
+    with open(path, "w") as f:
+        f.write('{"total": %d, "offers": [' % offers)
+        for i in range(offers):
+            if i:
+                f.write(",")
+            json.dump({
+                "id": i,
+                "hotelName": f"Hotel {i}",
+                "destinationId": random.choice([160, 162, 164, 171, 376]),
+                "rating": random.randint(1, 5),
+                "board": random.choice(["RO", "BB", "HB", "FB", "AI"]),
+                "nights": random.randint(2, 14),
+                "pricePerPerson": round(random.uniform(150, 2000), 2),
+                "departureDate": f"2026-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+                "amenities": random.sample(["6", "8", "9", "10", "11", "12", "13", "14", "18", "22"], 4),
+                "description": "x" * 600
+            }, f)
+        f.write("]}")
+
+
+async def read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+            await asyncio.sleep(0)
+
+
+async def parse_full(path: str):
+    body = b"".join([chunk async for chunk in read_chunks(path)])
+    first_offer_at = None
+    count = 0
+    for offer in json.loads(body)["offers"]:
+        if first_offer_at is None:
+            first_offer_at = time.perf_counter()
+        count += 1
+    return count, first_offer_at
+
+
+async def parse_incremental(path: str):
+    from classes.JsonStream import JsonArrayStream
+
+    first_offer_at = None
+    count = 0
+    async for offer in JsonArrayStream().items(read_chunks(path)):
+        if first_offer_at is None:
+            first_offer_at = time.perf_counter()
+        count += 1
+    return count, first_offer_at
+
+
+def run_mode(mode: str, path: str):
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    parse = parse_full if mode == "full" else parse_incremental
+
+    started = time.perf_counter()
+    count, first_offer_at = asyncio.run(parse(path))
+    finished = time.perf_counter()
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "mode": mode,
+        "offers": count,
+        "first_offer_ms": round((first_offer_at - started) * 1000, 1),
+        "total_ms": round((finished - started) * 1000, 1),
+        "peak_rss_growth_mb": round((peak_kb - baseline_kb) / 1024, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--offers", type=int, default=50000)
+    parser.add_argument("--mode", choices=["full", "incremental"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "offers.json")
+        write_document(path, args.offers)
+        print(f"Document size: {os.path.getsize(path) / 1024 / 1024:.1f} MB, {args.offers} offers")
+        for mode in ("full", "incremental"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--path", path], check=True)
+
+
+if __name__ == "__main__":
+    main()
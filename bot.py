@@ -2,18 +2,38 @@ import os
 import json
 import asyncio
 import logging
-from typing import Dict, Any
-from fastapi import FastAPI, WebSocket
-from openai import OpenAI
+import hmac
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from datetime import datetime
-import mapping
-import destination_group_mapping
-import destination_theme_mapping
-import hotel_facilities_mapping
+import catalog
+from destination_index import Match
 import classes.HotelSearcher as HotelSearcher
 import classes.OfferLoader as OfferLoader
-from itertools import chain
+import classes.OfferTable as OfferTable
+import classes.HttpClient as HttpClient
+import classes.SearchCache as SearchCache
+import classes.FakeOpenAI as FakeOpenAI
+import classes.RunPoller as RunPoller
+import classes.AssistantProvisioner as AssistantProvisioner
+import classes.ConversationRegistry as ConversationRegistry
+import classes.ConversationStore as ConversationStore
+import classes.ConversationQueue as ConversationQueue
+import classes.TurnCounter as TurnCounter
+import classes.ToolExecutor as ToolExecutor
+import classes.ToolOutput as ToolOutput
+import classes.IntentParser as IntentParser
+import classes.ResponseCache as ResponseCache
+import classes.Metrics as Metrics
+import classes.TurnTracer as TurnTracer
+import classes.SamplingProfiler as SamplingProfiler
 
 
 # Configure logging
@@ -26,16 +46,104 @@ load_dotenv()
 # Initialize FastAPI app
 app = FastAPI()
 
+# Run against the in-process fake instead of the real API (local development and load tests)
+USE_FAKE_OPENAI = os.getenv("USE_FAKE_OPENAI", "").lower() in ("1", "true", "yes")
+
+# Stream replies token by token over the WebSocket instead of polling the run to completion
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1").lower() in ("1", "true", "yes")
+
 # Check for required environment variables
-if not os.getenv("OPENAI_API_KEY"):
+if not USE_FAKE_OPENAI and not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+if USE_FAKE_OPENAI:
+    client = FakeOpenAI.FakeAsyncOpenAI(latency=float(os.getenv("FAKE_OPENAI_LATENCY", "0.05")))
+else:
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+# Latency of each stage of a turn, exported on /metrics
+stage_seconds = Metrics.registry.histogram("bot_stage_duration_seconds", "Time spent in each stage of a turn", ["stage"])
+stage_errors = Metrics.registry.counter("bot_stage_errors_total", "Stages that raised or were cancelled", ["stage"])
+tool_call_seconds = Metrics.registry.histogram("bot_tool_call_duration_seconds", "Time spent in each tool call", ["tool"])
+tool_calls = Metrics.registry.counter("bot_tool_calls_total", "Tool calls by outcome", ["tool", "status"])
+runs_in_flight = Metrics.registry.gauge("bot_runs_in_flight", "Assistant runs being waited on")
+open_connections = Metrics.registry.gauge("bot_websocket_connections", "Open WebSocket connections")
+
+# Turns slower than SLOW_TURN_THRESHOLD seconds (negative: off) keep a trace of every stage for /admin/traces
+turn_tracer = TurnTracer.TurnTracer(
+    threshold=float(os.getenv("SLOW_TURN_THRESHOLD", "5")),
+    max_traces=int(os.getenv("SLOW_TURN_TRACES", "100"))
+)
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the enclosed block as stage `name`, in the metrics and the turn's trace
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        stage_seconds.observe(duration, stage=name)
+        TurnTracer.TurnTracer.record(name, started, duration, error=failed)
+
+async def timed(name: str, call: Awaitable[Any]) -> Any:
+    with stage(name):
+        return await call
+
+def observe_tool_call(name: str, duration: float, succeeded: bool):
+    status = "success" if succeeded else "error"
+    tool_call_seconds.observe(duration, tool=name)
+    tool_calls.inc(tool=name, status=status)
+    TurnTracer.TurnTracer.record("tool_call", time.perf_counter() - duration, duration, tool=name, status=status)
 
-# Store active conversations
-active_conversations: Dict[str, Any] = {}
+# result_id of every search made during the current turn, given to the client with the reply
+turn_result_ids: "ContextVar[Optional[List[str]]]" = ContextVar("turn_result_ids", default=None)
+
+def reply_frame(message_id: str, text: str) -> Dict[str, Any]:
+    """
+    The "end" frame of a reply, with the turn's search results the client can fetch from /results
+    """
+    frame = {"type": "end", "message_id": message_id, "text": text}
+    result_ids = turn_result_ids.get()
+    if result_ids:
+        frame["result_ids"] = list(result_ids)
+    return frame
+
+# Deadlines (seconds) for the backend calls made by make_search
+HOTEL_SEARCH_TIMEOUT = float(os.getenv("HOTEL_SEARCH_TIMEOUT", "10"))
+OFFER_LOAD_TIMEOUT = float(os.getenv("OFFER_LOAD_TIMEOUT", "10"))
+
+# Shared scheduler polling all in-flight runs when streaming is disabled
+run_poller = RunPoller.RunPoller(
+    client,
+    min_interval=float(os.getenv("RUN_POLL_MIN_INTERVAL", "0.25")),
+    max_interval=float(os.getenv("RUN_POLL_MAX_INTERVAL", "2.0")),
+    backoff=float(os.getenv("RUN_POLL_BACKOFF", "1.5"))
+)
+
+# OpenAI API calls per turn, a turn that would go over TURN_API_CALL_BUDGET (0: no limit) is stopped
+turn_stats = TurnCounter.TurnStats(budget=int(os.getenv("TURN_API_CALL_BUDGET", "0")))
+
+# Conversation -> thread sessions, bounded in size and dropped after a period of inactivity
+CONVERSATION_IDLE_TTL = float(os.getenv("CONVERSATION_IDLE_TTL", str(6 * 3600)))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+conversations = ConversationRegistry.ConversationRegistry(
+    max_sessions=CONVERSATION_MAX_SESSIONS,
+    idle_ttl=CONVERSATION_IDLE_TTL
+)
+
+# State shared with the other workers: conversation threads and per-conversation turn locks
+conversation_store = ConversationStore.from_env(idle_ttl=CONVERSATION_IDLE_TTL, max_sessions=CONVERSATION_MAX_SESSIONS)
+CONVERSATION_SWEEP_INTERVAL = float(os.getenv("CONVERSATION_SWEEP_INTERVAL", "60"))
 
 def validate_search_params(params: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -149,66 +257,139 @@ def validate_search_params(params: Dict[str, Any]) -> Dict[str, Any]:
     
     return validated_params
 
-def make_search(json_data: str) -> str:
+async def run_with_deadline(name: str, call: Awaitable[Any], timeout: float) -> Tuple[Any, Optional[str]]:
+    """
+    Await a backend call, returning (result, None) or (None, reason) if it failed or missed its deadline
+    """
+    try:
+        return await asyncio.wait_for(call, timeout=timeout), None
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} did not finish within {timeout}s")
+        return None, f"{name} timed out after {timeout}s"
+    except Exception as e:
+        logger.error(f"{name} failed: {str(e)}")
+        return None, str(e)
+
+def resolve_names(match: Callable[[str], Optional[Match]], kind: str, names: List[str], resolution: Dict[str, List[Dict[str, Any]]]) -> List[Match]:
+    """
+    Catalog entries for the given names, dropping the ones that can't be resolved.
+    Misses and inexact matches are added to `resolution` for the assistant to check with the user.
+    """
+    matches = []
+    for name in names:
+        found = match(name)
+        if found is None:
+            resolution.setdefault("unresolved", []).append({"kind": kind, "name": name})
+            continue
+        if found.score < 1.0:
+            resolution.setdefault("fuzzy", []).append({"kind": kind, "name": name, "matched": found.name.strip(), "score": round(found.score, 2)})
+        matches.append(found)
+    return matches
+
+# makeSearch arguments the assistant schema names differently, and the field make_search reads them as
+SCHEMA_FIELDS = {
+    "destinationNames": "destination_names",
+    "hotel_type_and_facilities": "hotel_facilities"
+}
+
+async def make_search(json_data: str) -> str:
     """
-    Function to handle holiday search requests
+    Function to handle holiday search requests, returns the tool output for the assistant
     """
     try:
         # Parse the JSON data
         search_data = json.loads(json_data)
         logger.info(f"Received search request with data: {search_data}")
-        if "destination_names" in search_data:
-            search_data["destinationIds"] = [mapping.map_destination(destination) for destination in search_data["destination_names"]]
-        if "destination_theme_names" in search_data:
-            mapped_ids = destination_theme_mapping.get_destination_ids_by_themes(search_data["destination_theme_names"])
+        for schema_field, field in SCHEMA_FIELDS.items():
+            values = search_data.pop(schema_field, None)
+            if isinstance(values, list):
+                search_data[field] = search_data.get(field, []) + values
 
-            if "destinationIds" not in search_data:
-                search_data["destinationIds"] = []
-            search_data["destinationIds"].extend(mapped_ids)
+        with stage("catalog_mapping"):
+            # One catalog version for the whole search, a reload swapping it mid-way doesn't affect us
+            current_catalog = catalog.current()
+            # Model output can differ slightly from catalog names, resolve before mapping
+            resolution: Dict[str, List[Dict[str, Any]]] = {}
+            if "destination_names" in search_data:
+                search_data["destinationIds"] = [match.value for match in resolve_names(current_catalog.match_destination, "destination", search_data["destination_names"], resolution)]
+            if "destination_theme_names" in search_data:
+                search_data["destination_theme_names"] = [match.name for match in resolve_names(current_catalog.match_theme, "theme", search_data["destination_theme_names"], resolution)]
+                mapped_ids = current_catalog.destination_ids_by_themes(search_data["destination_theme_names"])
 
-        if "hotel_facilities" in search_data:
-            mapped_ids = hotel_facilities_mapping.get_facilites_ids(search_data["hotel_facilities"])
+                if "destinationIds" not in search_data:
+                    search_data["destinationIds"] = []
+                search_data["destinationIds"].extend(mapped_ids)
 
-            if "amenities" not in search_data:
-                search_data["amenities"] = []
-            search_data["amenities"].extend(mapped_ids)
+            if "hotel_facilities" in search_data:
+                mapped_ids = current_catalog.facility_ids_for(search_data["hotel_facilities"])
 
+                if "amenities" not in search_data:
+                    search_data["amenities"] = []
+                search_data["amenities"].extend(mapped_ids)
 
-        if "destination_group_names" in search_data:
-            mapped_ids = list(chain.from_iterable(
-                destination_group_mapping.get_group_destinations_ids(group_name)
-                for group_name in search_data["destination_group_names"]
-            ))
 
-            if "destinationIds" not in search_data:
-                search_data["destinationIds"] = []
-            search_data["destinationIds"].extend(mapped_ids)
+            if "destination_group_names" in search_data:
+                search_data["destination_group_names"] = [match.name for match in resolve_names(current_catalog.match_group, "destination group", search_data["destination_group_names"], resolution)]
+                mapped_ids = current_catalog.group_destination_ids(search_data["destination_group_names"])
 
+                if "destinationIds" not in search_data:
+                    search_data["destinationIds"] = []
+                search_data["destinationIds"].extend(mapped_ids)
 
-        search_data["destinationIds"] = [d for d in search_data["destinationIds"] if d is not None]
+
+            search_data["destinationIds"] = [d for d in search_data.get("destinationIds", []) if d is not None]
 
         logger.info("Finished Mapping")
         logger.info("#############")
-        logger.info(f"Destinations ids: {search_data["destinationIds"]}")
+        logger.info(f"Destinations ids: {search_data['destinationIds']}")
         logger.info("########")
 
-        logger.info(f"Start to search for hotels")
-        hotels = HotelSearcher.searchHotels(search_data)
-        logger.info(f"Finished searching for hotels")
+        # Hotel search and offer loading are independent, run them side by side
+        logger.info(f"Start to search for hotels and load offers")
+        (hotels, hotels_error), (offers, offers_error) = await asyncio.gather(
+            run_with_deadline("hotel search", timed("hotel_search", HotelSearcher.searchHotels(search_data)), HOTEL_SEARCH_TIMEOUT),
+            run_with_deadline("offer loading", timed("offer_load", OfferLoader.load_offers(search_data, current_catalog=current_catalog)), OFFER_LOAD_TIMEOUT)
+        )
+        logger.info(f"Finished searching for hotels and loading offers")
+
+        # OfferLoader reports its own failures by returning None
+        if offers is None and offers_error is None:
+            offers_error = "offer loading failed"
 
-        logger.info(f"Start to load offers")
-        offers = OfferLoader.load_offers()
-        logger.info(f"Finished loading offers")
-        
-        
+        unavailable = {
+            source: error
+            for source, error in (("hotels", hotels_error), ("offers", offers_error))
+            if error is not None
+        }
+        if len(unavailable) == 2:
+            return json.dumps({
+                "status": "error",
+                "message": f"Failed to fetch holiday offers: {unavailable}"
+            })
 
         # Here you can implement your actual search logic using validated_params
         # For now, we'll return a mock response
-        return json.dumps({
-            "status": "success",
+        response = {
+            "status": "partial" if unavailable else "success",
             "message": "Search completed here is the link to the offers https://agent.holidayheroes.com/holidayfinder/proposal/view/75",
             "data": search_data
-        })
+        }
+        if offers is not None:
+            table = OfferTable.OfferTable.from_offers(offers["offers"])
+            matching = table.filter(**OfferTable.criteria_from_search(search_data))
+            response["offers_found"] = len(matching)
+            response["offers"] = matching.records(matching.top_k(len(matching)))
+        if unavailable:
+            response["unavailable"] = unavailable
+        if resolution:
+            response["name_resolution"] = resolution
+
+        # The assistant gets the best few offers, the client can fetch everything by result_id
+        result_id, output = await ToolOutput.compact_and_store(response)
+        result_ids = turn_result_ids.get()
+        if result_ids is not None:
+            result_ids.append(result_id)
+        return output
     except json.JSONDecodeError:
         return json.dumps({
             "status": "error",
@@ -220,221 +401,317 @@ def make_search(json_data: str) -> str:
             "message": str(e)
         })
 
-def get_or_create_assistant():
-    """
-    Get the assistant ID from environment or create a new assistant
-    """
-    assistant_id = os.getenv("ASSISTANT_ID")
-    
-    if assistant_id:
-        try:
-            # Try to retrieve the existing assistant
-            assistant = client.beta.assistants.retrieve(assistant_id)
-            logger.info(f"Found existing assistant: {assistant.name}")
-            return assistant_id
-        except Exception as e:
-            logger.warning(f"Could not find assistant with ID {assistant_id}: {str(e)}")
-    
-    # Create a new assistant
-    logger.info("Creating new assistant")
-    assistant = client.beta.assistants.create(
-        name="Holiday Search Assistant",
-        instructions="""You are a helpful AI assistant that helps users find their perfect holiday.
+# Assistant the bot runs against, synced to OpenAI by the provisioner below
+ASSISTANT_DEFINITION = {
+    "name": "Holiday Search Assistant",
+    "instructions": """You are a helpful AI assistant that helps users find their perfect holiday.
         When a user asks about holiday options, use the makeSearch function with the appropriate parameters.
         Always try to understand the user's preferences and convert them into structured search parameters.
         If the user mentions a broad destination (like Europe), include all relevant cities in the destinationNames array.
         Make sure to validate dates and ensure they are in the future.
         Format all responses in a user-friendly way.""",
-        model="gpt-4-turbo-preview",
-        tools=[{
-            "type": "function",
-            "function": {
-                "name": "makeSearch",
-                "description": "Do a search for holidays based on the user search criteria",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "stars": {
-                            "type": "array",
-                            "description": "the star rating to apply",
-                            "items": {
-                                "type": "number",
-                                "enum": [1, 2, 3, 4, 5]
-                            }
-                        },
-                        "destinationNames": {
-                            "type": "array",
-                            "description": "The destination it's possible to search vacation at",
-                            "items": {
-                                "type": "string",
-                                "enum": ["Paris", "Faro"]
-                            }
-                        },
-                        "max_price_per_person": {
+    "model": "gpt-4-turbo-preview",
+    "tools": [{
+        "type": "function",
+        "function": {
+            "name": "makeSearch",
+            "description": "Do a search for holidays based on the user search criteria",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "stars": {
+                        "type": "array",
+                        "description": "the star rating to apply",
+                        "items": {
                             "type": "number",
-                            "min": 0,
-                            "max": 2000
-                        },
-                        "weekendOnly": {
-                            "type": "boolean",
-                            "description": "if the customer want trips only at weekend"
-                        },
-                        "vacation_type": {
-                            "type": "array",
-                            "description": "The theme of the vacation the customer is looking for",
-                            "items": {
+                            "enum": [1, 2, 3, 4, 5]
+                        }
+                    },
+                    "destinationNames": {
+                        "type": "array",
+                        "description": "The destination it's possible to search vacation at",
+                        "items": {
+                            "type": "string",
+                            "enum": ["Paris", "Faro"]
+                        }
+                    },
+                    "max_price_per_person": {
+                        "type": "number",
+                        "min": 0,
+                        "max": 2000
+                    },
+                    "weekendOnly": {
+                        "type": "boolean",
+                        "description": "if the customer want trips only at weekend"
+                    },
+                    "vacation_type": {
+                        "type": "array",
+                        "description": "The theme of the vacation the customer is looking for",
+                        "items": {
+                            "type": "string",
+                            "enum": ["Casino Trip", "Instagram Places"]
+                        }
+                    },
+                    "room_board_type": {
+                        "type": "array",
+                        "description": "The room board type",
+                        "items": {
+                            "type": "string",
+                            "enum": [
+                                "room only",
+                                "with breakfast",
+                                "breakfast and dinner",
+                                "breakfast lunch and dinner",
+                                "all inclusive"
+                            ]
+                        }
+                    },
+                    "hotel_type_and_facilities": {
+                        "type": "array",
+                        "description": "The type of hotel and the facilities that the hotel have in it",
+                        "items": {
+                            "type": "string",
+                            "enum": [
+                                "Parking",
+                                "Close to beach",
+                                "All inclusive hotel",
+                                "hotel have Water park"
+                            ]
+                        }
+                    },
+                    "travelMonth": {
+                        "type": "array",
+                        "description": "the number that represent the month of his travel plans",
+                        "items": {
+                            "type": "number"
+                        }
+                    },
+                    "number_of_nights": {
+                        "type": "array",
+                        "description": "The number of nights the customer want to travel",
+                        "items": {
+                            "type": "number"
+                        }
+                    },
+                    "vacation_specific_dates": {
+                        "type": "object",
+                        "description": "The starting date and end date of the range of dates the customer is willing to travel",
+                        "properties": {
+                            "start_date": {
                                 "type": "string",
-                                "enum": ["Casino Trip", "Instagram Places"]
-                            }
-                        },
-                        "room_board_type": {
-                            "type": "array",
-                            "description": "The room board type",
-                            "items": {
+                                "format": "date"
+                            },
+                            "end_date": {
                                 "type": "string",
-                                "enum": [
-                                    "room only",
-                                    "with breakfast",
-                                    "breakfast and dinner",
-                                    "breakfast lunch and dinner",
-                                    "all inclusive"
-                                ]
+                                "format": "date"
                             }
-                        },
-                        "hotel_type_and_facilities": {
-                            "type": "array",
-                            "description": "The type of hotel and the facilities that the hotel have in it",
-                            "items": {
+                        }
+                    },
+                    "vacation_date_range": {
+                        "type": "object",
+                        "description": "The starting date and end date of the range of dates the customer is willing to travel",
+                        "properties": {
+                            "start_date": {
                                 "type": "string",
-                                "enum": [
-                                    "Parking",
-                                    "Close to beach",
-                                    "All inclusive hotel",
-                                    "hotel have Water park"
-                                ]
-                            }
-                        },
-                        "travelMonth": {
-                            "type": "array",
-                            "description": "the number that represent the month of his travel plans",
-                            "items": {
-                                "type": "number"
-                            }
-                        },
-                        "number_of_nights": {
-                            "type": "array",
-                            "description": "The number of nights the customer want to travel",
-                            "items": {
-                                "type": "number"
-                            }
-                        },
-                        "vacation_specific_dates": {
-                            "type": "object",
-                            "description": "The starting date and end date of the range of dates the customer is willing to travel",
-                            "properties": {
-                                "start_date": {
-                                    "type": "string",
-                                    "format": "date"
-                                },
-                                "end_date": {
-                                    "type": "string",
-                                    "format": "date"
-                                }
-                            }
-                        },
-                        "vacation_date_range": {
-                            "type": "object",
-                            "description": "The starting date and end date of the range of dates the customer is willing to travel",
-                            "properties": {
-                                "start_date": {
-                                    "type": "string",
-                                    "format": "date"
-                                },
-                                "end_date": {
-                                    "type": "string",
-                                    "format": "date"
-                                }
+                                "format": "date"
+                            },
+                            "end_date": {
+                                "type": "string",
+                                "format": "date"
                             }
-                        },
-                        "adults_children_capacity": {
-                            "type": "object",
-                            "description": "how much and who are the people that is traveling",
-                            "properties": {
-                                "number_of_adults": {
-                                    "type": "number",
-                                    "description": "the number of adults that is going to the vacation"
-                                },
-                                "number_of_children": {
+                        }
+                    },
+                    "adults_children_capacity": {
+                        "type": "object",
+                        "description": "how much and who are the people that is traveling",
+                        "properties": {
+                            "number_of_adults": {
+                                "type": "number",
+                                "description": "the number of adults that is going to the vacation"
+                            },
+                            "number_of_children": {
+                                "type": "number",
+                                "description": "the number of children that is going to the vacation"
+                            },
+                            "children_ages": {
+                                "type": "array",
+                                "description": "The ages of the children, can be from age 1 to 17",
+                                "items": {
                                     "type": "number",
-                                    "description": "the number of children that is going to the vacation"
-                                },
-                                "children_ages": {
-                                    "type": "array",
-                                    "description": "The ages of the children, can be from age 1 to 17",
-                                    "items": {
-                                        "type": "number",
-                                        "min": 1,
-                                        "max": 17
-                                    }
+                                    "min": 1,
+                                    "max": 17
                                 }
                             }
                         }
                     }
                 }
             }
-        }]
-    )
-    
-    # Save the new assistant ID to .env file
+        }
+    }]
+}
+
+def save_assistant_id(assistant_id: str):
+    """
+    Save a newly created assistant ID to the .env file
+    """
     with open('.env', 'a') as f:
-        f.write(f"\nASSISTANT_ID={assistant.id}")
-    
-    logger.info(f"Created new assistant with ID: {assistant.id}")
-    return assistant.id
+        f.write(f"\nASSISTANT_ID={assistant_id}")
+
+# Startup doesn't wait on the OpenAI API, the assistant is resolved in the background (default),
+# on the first message ("lazy") or before the server accepts connections ("eager")
+ASSISTANT_PROVISIONING = os.getenv("ASSISTANT_PROVISIONING", "background").lower()
+
+# The fake's IDs don't outlive the process, so nothing is cached or saved for it
+assistant = AssistantProvisioner.AssistantProvisioner(
+    client,
+    ASSISTANT_DEFINITION,
+    assistant_id=os.getenv("ASSISTANT_ID") or None,
+    cache_path=None if USE_FAKE_OPENAI else os.getenv("ASSISTANT_CACHE_PATH", ".assistant_cache.json") or None,
+    on_created=None if USE_FAKE_OPENAI else save_assistant_id
+)
+
+@app.on_event("startup")
+async def provision_assistant():
+    if ASSISTANT_PROVISIONING == "eager":
+        await assistant.ensure()
+    elif ASSISTANT_PROVISIONING != "lazy":
+        assistant.start()
+
+@app.on_event("shutdown")
+async def stop_assistant_provisioning():
+    await assistant.stop()
+
+async def get_thread_id(conversation_id: str) -> Optional[str]:
+    """
+    Return the OpenAI thread ID of a conversation, None if it has no thread yet
+    """
+    session = conversations.get(conversation_id)
+    if session is not None:
+        await conversation_store.touch(conversation_id)
+        return session.thread_id
+
+    # Another worker may have started this conversation
+    thread_id = await conversation_store.get_thread(conversation_id)
+    if thread_id is not None:
+        conversations.add(conversation_id, thread_id)
+    return thread_id
+
+async def register_thread(conversation_id: str, thread_id: str):
+    await conversation_store.set_thread(conversation_id, thread_id)
+    conversations.add(conversation_id, thread_id)
+
+async def remember_exchange(conversation_id: str, message: str, reply: str):
+    """
+    Keep an exchange answered without a thread, the thread starts with it if the user continues.
+    Seeds live in the shared store, so the follow-up may land on any worker.
+    """
+    await conversation_store.set_seed(conversation_id, [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply}
+    ])
+
+async def start_run(conversation_id: str, thread_id: Optional[str], message: str, turn: TurnCounter.TurnCounter, stream: bool = False):
+    """
+    Start a run with the user message attached in the same request. Without a thread
+    the thread is created together with the run, starting with any exchange that was
+    answered from the response cache.
+    """
+    assistant_id = await assistant.ensure()
+    if thread_id is None:
+        logger.info("Creating new thread and running assistant")
+        turn.count("threads.create_and_run")
+        return await client.beta.threads.create_and_run(
+            assistant_id=assistant_id,
+            thread={"messages": await conversation_store.take_seed(conversation_id) + [{"role": "user", "content": message}]},
+            stream=stream
+        )
+
+    logger.info("Running assistant")
+    turn.count("runs.create")
+    return await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        additional_messages=[{"role": "user", "content": message}],
+        stream=stream
+    )
+
+# Tools the assistant can call, all calls of a run step run concurrently and are submitted together
+tools = ToolExecutor.ToolExecutor(
+    max_concurrency=int(os.getenv("TOOL_MAX_CONCURRENCY", "16")),
+    thread_workers=int(os.getenv("TOOL_THREAD_WORKERS", "4")),
+    on_finish=observe_tool_call
+)
+
+@tools.register("makeSearch")
+async def make_search_tool(arguments: Dict[str, Any]) -> str:
+    return await make_search(json.dumps(arguments))
 
-# Get or create assistant at startup
-ASSISTANT_ID = get_or_create_assistant()
+@app.on_event("shutdown")
+async def close_tools():
+    tools.close()
 
-async def process_message_with_assistant(message: str, conversation_id: str) -> str:
+@app.on_event("startup")
+async def start_catalog_watcher():
+    await catalog.store.start()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await HttpClient.close()
+
+@app.on_event("shutdown")
+async def stop_catalog_watcher():
+    await catalog.store.stop()
+
+@app.on_event("startup")
+async def start_conversation_sweeper():
+    conversations.start(CONVERSATION_SWEEP_INTERVAL)
+
+@app.on_event("shutdown")
+async def stop_conversation_sweeper():
+    await conversations.stop()
+    await conversation_store.close()
+
+async def cancel_run(thread_id: str, run_id: str, turn: TurnCounter.TurnCounter):
+    """
+    Cancel a run the turn gives up on. A thread accepts no new run while one is active,
+    so an abandoned run would block the conversation until it expires.
+    """
+    try:
+        turn.count("runs.cancel", enforce=False)
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        logger.info(f"Cancelled run {run_id}")
+    except Exception as e:
+        logger.warning(f"Could not cancel run {run_id}: {str(e)}")
+
+async def process_message_with_assistant(message: str, conversation_id: str, turn: TurnCounter.TurnCounter) -> str:
     """
     Process a message using the OpenAI assistant and return the response.
     """
+    # The run this turn started, until it reaches a terminal status
+    thread_id = None
+    open_run_id = None
     try:
         logger.info(f"Processing message for conversation {conversation_id}")
-        
-        # Get or create conversation thread
-        if conversation_id not in active_conversations:
-            logger.info("Creating new thread")
-            thread = client.beta.threads.create()
-            active_conversations[conversation_id] = thread.id
-        else:
-            logger.info("Retrieving existing thread")
-            thread_id = active_conversations[conversation_id]
-            thread = client.beta.threads.retrieve(thread_id)
-
-        # Add message to thread
-        logger.info("Adding message to thread")
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=message
-        )
 
-        # Run the assistant
-        logger.info("Running assistant")
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=ASSISTANT_ID
-        )
+        with stage("thread_setup"):
+            thread_id = await get_thread_id(conversation_id)
+        # A new thread is created by the same request as the run
+        with stage("run_create"):
+            run = await start_run(conversation_id, thread_id, message, turn)
+            if thread_id is None:
+                thread_id = run.thread_id
+                await register_thread(conversation_id, thread_id)
+        open_run_id = run.id
+        conversations.set_run(conversation_id, run.id)
 
         # Wait for the run to complete
         while True:
-            run_status = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
+            with stage("run_wait"):
+                run_status = await run_poller.wait(thread_id, run.id, on_poll=lambda: turn.count("runs.retrieve", enforce=False))
             
             logger.info(f"Run status: {run_status.status}")
+            if run_status.status != 'requires_action':
+                open_run_id = None
             
             if run_status.status == 'completed':
                 break
@@ -445,58 +722,394 @@ async def process_message_with_assistant(message: str, conversation_id: str) ->
                 logger.error("Run expired")
                 return "Sorry, the request timed out. Please try again."
             elif run_status.status == 'requires_action':
-                # Handle function calls
-                for tool_call in run_status.required_action.submit_tool_outputs.tool_calls:
-                    if tool_call.function.name == "makeSearch":
-                        # Get the JSON parameter
-                        args = json.loads(tool_call.function.arguments)
-                        
-                        # Call the function
-                        result = make_search(json.dumps(args))
-                        
-                        # Submit the result back to the assistant
-                        client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=thread.id,
-                            run_id=run.id,
-                            tool_outputs=[{
-                                "tool_call_id": tool_call.id,
-                                "output": result
-                            }]
-                        )
-            
-            await asyncio.sleep(1)
+                # Run the step's tool calls concurrently and submit all outputs at once
+                tool_outputs = await tools.run_all(run_status.required_action.submit_tool_outputs.tool_calls)
+                turn.count("runs.submit_tool_outputs")
+                with stage("submit_tool_outputs"):
+                    await client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs
+                    )
+            else:
+                # cancelled, incomplete or any other state the run doesn't leave on its own
+                logger.error(f"Run ended with status {run_status.status}")
+                return f"Sorry, the request ended unexpectedly ({run_status.status}). Please try again."
 
-        # Get the assistant's response
+        # Get the assistant's response, only the messages this run added
         logger.info("Retrieving assistant response")
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        last_message = messages.data[0]
-        
-        return last_message.content[0].text.value
+        # The run has finished, its reply is read even when the budget is used up
+        turn.count("messages.list", enforce=False)
+        with stage("messages_list"):
+            messages = await client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, order="asc")
+
+        return "\n\n".join(
+            part.text.value
+            for reply in messages.data if reply.role == "assistant"
+            for part in reply.content if part.type == "text"
+        )
 
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}", exc_info=True)
+        if open_run_id is not None:
+            await cancel_run(thread_id, open_run_id, turn)
         return f"Sorry, I encountered an error: {str(e)}"
+    finally:
+        conversations.set_run(conversation_id, None)
+
+async def stream_message_with_assistant(message: str, conversation_id: str, send: Callable[[Dict[str, Any]], Awaitable[None]], turn: TurnCounter.TurnCounter) -> str:
+    """
+    Process a message using a streamed assistant run, forwarding text deltas as they arrive.
+
+    Frames passed to `send`:
+        {"type": "start", "message_id": ...}
+        {"type": "delta", "message_id": ..., "text": ...}
+        {"type": "end", "message_id": ..., "text": <full reply>}
+        {"type": "error", "message_id": ..., "text": ...}
+    """
+    message_id = uuid.uuid4().hex
+    reply_parts = []
+
+    await send({"type": "start", "message_id": message_id})
+
+    # The run this turn started, until its stream ends
+    thread_id = None
+    open_run_id = None
+    try:
+        logger.info(f"Streaming message for conversation {conversation_id}")
+
+        with stage("thread_setup"):
+            thread_id = await get_thread_id(conversation_id)
+        with stage("run_create"):
+            stream = await start_run(conversation_id, thread_id, message, turn, stream=True)
+
+        # A run with tool calls continues on the stream returned by submit_tool_outputs
+        while stream is not None:
+            required_run = None
+            # Time until the run ends or asks for tools, including forwarding the deltas
+            with stage("stream_wait"):
+                # Closed on every way out: tool calls, a terminal event or an error
+                async with stream:
+                    async for event in stream:
+                        if event.event == "thread.run.created":
+                            if thread_id is None:
+                                thread_id = event.data.thread_id
+                                await register_thread(conversation_id, thread_id)
+                            open_run_id = event.data.id
+                            conversations.set_run(conversation_id, event.data.id)
+                        elif event.event == "thread.message.delta":
+                            for part in event.data.delta.content or []:
+                                if part.type == "text" and part.text and part.text.value:
+                                    reply_parts.append(part.text.value)
+                                    await send({"type": "delta", "message_id": message_id, "text": part.text.value})
+                        elif event.event == "thread.run.requires_action":
+                            required_run = event.data
+                            break
+                        elif event.event == "thread.run.failed":
+                            logger.error(f"Run failed: {event.data.last_error}")
+                            error = f"Sorry, I encountered an error: {event.data.last_error}"
+                            await send({"type": "error", "message_id": message_id, "text": error})
+                            return error
+                        elif event.event == "thread.run.expired":
+                            logger.error("Run expired")
+                            error = "Sorry, the request timed out. Please try again."
+                            await send({"type": "error", "message_id": message_id, "text": error})
+                            return error
+                        elif event.event in ("thread.run.cancelled", "thread.run.incomplete"):
+                            status = event.event.rsplit(".", 1)[-1]
+                            logger.error(f"Run ended with status {status}")
+                            error = f"Sorry, the request ended unexpectedly ({status}). Please try again."
+                            await send({"type": "error", "message_id": message_id, "text": error})
+                            return error
+
+            stream = None
+            if required_run is not None:
+                tool_outputs = await tools.run_all(required_run.required_action.submit_tool_outputs.tool_calls)
+                turn.count("runs.submit_tool_outputs")
+                with stage("submit_tool_outputs"):
+                    stream = await client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id,
+                        run_id=required_run.id,
+                        tool_outputs=tool_outputs,
+                        stream=True
+                    )
+        open_run_id = None
+
+        reply = "".join(reply_parts)
+        await send(reply_frame(message_id, reply))
+        return reply
+
+    except Exception as e:
+        logger.error(f"Error streaming message: {str(e)}", exc_info=True)
+        if open_run_id is not None:
+            await cancel_run(thread_id, open_run_id, turn)
+        error = f"Sorry, I encountered an error: {str(e)}"
+        await send({"type": "error", "message_id": message_id, "text": error})
+        return error
+    finally:
+        conversations.set_run(conversation_id, None)
+
+@app.get("/stats")
+async def stats():
+    """
+    Runtime counters used to size pools and pollers
+    """
+    return {
+        "http": HttpClient.stats(),
+        "search_cache": SearchCache.search_cache.stats(),
+        "search_coalescing": SearchCache.search_flights.stats(),
+        "search_results": ToolOutput.results.stats(),
+        "run_poller": run_poller.stats(),
+        "catalog": catalog.store.stats(),
+        "assistant": assistant.stats(),
+        "conversations": conversations.stats(),
+        "conversation_store": conversation_store.stats(),
+        "turn_queue": turn_queue.stats(),
+        "turns": turn_stats.stats(),
+        "tools": tools.stats(),
+        "intent_fast_path": {"enabled": INTENT_FAST_PATH, **intent_parser.stats()},
+        "response_cache": {"enabled": RESPONSE_CACHE_ENABLED, **response_cache.stats()},
+        "slow_turns": turn_tracer.stats()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Stage latencies, tool calls and in-flight gauges in the Prometheus text format
+    """
+    return Response(content=Metrics.registry.render(), media_type=Metrics.CONTENT_TYPE)
+
+# Admin endpoints need "Authorization: Bearer <ADMIN_TOKEN>" and don't exist without a token
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+profiler = SamplingProfiler.SamplingProfiler(
+    interval=float(os.getenv("PROFILER_INTERVAL", "0.01")),
+    max_seconds=float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+)
+
+def admin_error(request: Request) -> Optional[JSONResponse]:
+    """
+    Error response for a request that may not use the admin endpoints, None if it may
+    """
+    if not ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Not found"})
+    # As bytes: compare_digest raises TypeError on non-ASCII str, headers arrive decoded as latin-1
+    authorization = request.headers.get("authorization", "").encode("latin-1")
+    if not hmac.compare_digest(authorization, f"Bearer {ADMIN_TOKEN}".encode()):
+        return JSONResponse(status_code=401, content={"status": "error", "message": "Unauthorized"})
+    return None
+
+@app.post("/admin/profile")
+async def start_profile(request: Request, seconds: float = 30):
+    """
+    Start sampling this worker's stacks for `seconds`
+    """
+    error = admin_error(request)
+    if error is not None:
+        return error
+    if not profiler.start(seconds):
+        return JSONResponse(status_code=409, content={"status": "error", "message": "A profile is already running", "profile": profiler.stats()})
+    return {"status": "started", "profile": profiler.stats()}
+
+@app.get("/admin/profile")
+async def profile_result(request: Request):
+    """
+    Folded stacks of the last finished profile
+    """
+    error = admin_error(request)
+    if error is not None:
+        return error
+    result = profiler.result()
+    if result is None:
+        return JSONResponse(status_code=404 if not profiler.running else 409, content={"status": "error", "message": "No finished profile", "profile": profiler.stats()})
+    return PlainTextResponse(result, headers={"Content-Disposition": f"attachment; filename=profile-{os.getpid()}.folded"})
+
+@app.get("/admin/traces")
+async def slow_turn_traces(request: Request):
+    """
+    Traces of the latest slow turns on this worker, newest first
+    """
+    error = admin_error(request)
+    if error is not None:
+        return error
+    return {"slow_turns": turn_tracer.stats(), "traces": turn_tracer.traces()}
+
+@app.on_event("shutdown")
+async def stop_profiler():
+    profiler.stop()
+
+@app.get("/results/{result_id}")
+async def search_result(result_id: str):
+    """
+    Full result of a search, by the result_id given to the assistant
+    """
+    result = await ToolOutput.load(result_id)
+    if result is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown or expired result"})
+    return result
+
+@app.get("/healthz")
+async def liveness():
+    """
+    The process is up and serving requests
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Ready once the assistant is resolved, or right away when it is provisioned lazily on first use
+    """
+    ready = assistant.ready or (ASSISTANT_PROVISIONING == "lazy" and assistant.state != "failed")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "assistant": assistant.stats(), "catalog": catalog.store.current().version}
+    )
+
+async def run_turn(conversation_id: str, messages: List[str], websockets: List[WebSocket]):
+    """
+    Answer a batch of queued messages and reply on every connection that sent one
+    """
+    message = "\n".join(messages)
+    turn_result_ids.set([])
+
+    async def send_json(frame: Dict[str, Any]):
+        for websocket in websockets:
+            try:
+                await websocket.send_json(frame)
+            except Exception as e:
+                logger.warning(f"Could not send to client {conversation_id}: {str(e)}")
+
+    async def send_reply(text: str):
+        # Replies produced without a run, streamed clients get them as a single start/end pair
+        if STREAM_RESPONSES:
+            message_id = uuid.uuid4().hex
+            await send_json({"type": "start", "message_id": message_id})
+            await send_json(reply_frame(message_id, text))
+            return
+        # Plain-text clients get links to the full results under the reply
+        links = [f"Full results: /results/{result_id}" for result_id in turn_result_ids.get() or []]
+        if links:
+            text = "\n\n".join([text, *links])
+        for websocket in websockets:
+            try:
+                await websocket.send_text(text)
+            except Exception as e:
+                logger.warning(f"Could not send to client {conversation_id}: {str(e)}")
+
+    # Only a conversation's opening message is answered without the assistant: later messages may reply
+    # to something it asked. Such an answer is kept and becomes the start of the thread if the user continues.
+    opening = (
+        (INTENT_FAST_PATH or RESPONSE_CACHE_ENABLED)
+        and not await conversation_store.get_seed(conversation_id)
+        and await get_thread_id(conversation_id) is None
+    )
+
+    # Plain search criteria are answered with a direct search
+    search = intent_parser.parse(message) if INTENT_FAST_PATH and opening else None
+    if search is not None:
+        TurnTracer.TurnTracer.annotate(path="intent_fast_path")
+        reply = IntentParser.format_reply(json.loads(await make_search(json.dumps(search))))
+        await remember_exchange(conversation_id, message, reply)
+        await send_reply(reply)
+        return
+
+    # Common opening messages are answered from the cache
+    first_turn = RESPONSE_CACHE_ENABLED and opening
+    version = f"{catalog.current().version}:{assistant.definition_hash}"
+    if first_turn:
+        cached = await response_cache.get(message, version)
+        if cached is not None:
+            TurnTracer.TurnTracer.annotate(path="response_cache")
+            await remember_exchange(conversation_id, message, cached)
+            await send_reply(cached)
+            return
+
+    TurnTracer.TurnTracer.annotate(path="assistant")
+    reply = await run_assistant_turn(conversation_id, message, send_json)
+    if not STREAM_RESPONSES:
+        # Send response back to client
+        await send_reply(reply)
+
+    # Error replies all start with "Sorry, " and are never cached
+    if first_turn and reply and not reply.startswith("Sorry, "):
+        await response_cache.put(message, version, reply)
+
+async def run_assistant_turn(conversation_id: str, message: str, send_json: Callable[[Dict[str, Any]], Awaitable[None]]) -> str:
+    """
+    Answer a message with the assistant and return the reply, which streamed clients have already received
+    """
+    # One turn at a time per conversation, across every connection and worker
+    turn = turn_stats.start()
+    try:
+        async with conversation_store.lock(conversation_id):
+            with runs_in_flight.track():
+                if STREAM_RESPONSES:
+                    # Stream the reply to the client as start/delta/end frames
+                    return await stream_message_with_assistant(message, conversation_id, send_json, turn)
+
+                # Process message with OpenAI assistant
+                return await process_message_with_assistant(message, conversation_id, turn)
+    finally:
+        turn_stats.finish(turn)
+        TurnTracer.TurnTracer.annotate(api_calls=dict(turn.calls))
+
+# Answer messages that only list search criteria with a direct search instead of an assistant run
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "0").lower() in ("1", "true", "yes")
+intent_parser = IntentParser.IntentParser()
+
+# Replies to first messages, keyed on the normalized message, catalog version and assistant definition.
+# Off by default: a cached reply (prices included) is served to every client asking the same thing.
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+response_cache = ResponseCache.ResponseCache(SearchCache.SearchCache(
+    path=os.getenv("RESPONSE_CACHE_PATH") or None,
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "900")),
+    memory_entries=int(os.getenv("RESPONSE_CACHE_ENTRIES", "1024"))
+))
+
+async def traced_turn(conversation_id: str, messages: List[str], websockets: List[WebSocket]):
+    with turn_tracer.trace(conversation_id):
+        TurnTracer.TurnTracer.annotate(messages=len(messages))
+        await run_turn(conversation_id, messages, websockets)
+
+# Messages a user sends within this many seconds (or while a reply is running) are answered in one run
+turn_queue = ConversationQueue.ConversationQueue(
+    traced_turn,
+    coalesce_window=float(os.getenv("MESSAGE_COALESCE_WINDOW", "0.25")),
+    max_batch=int(os.getenv("MESSAGE_COALESCE_MAX_BATCH", "10")),
+    max_pending=int(os.getenv("MESSAGE_QUEUE_MAX_PENDING", "20")),
+    on_wait=lambda seconds: stage_seconds.observe(seconds, stage="websocket_receive")
+)
+
+@app.on_event("shutdown")
+async def stop_turn_queue():
+    await turn_queue.stop()
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
     await websocket.accept()
     logger.info(f"New WebSocket connection from client {client_id}")
+    open_connections.inc()
     
     try:
         while True:
             # Receive message from client
             message = await websocket.receive_text()
             logger.info(f"Received message from client {client_id}: {message}")
-            
-            # Process message with OpenAI assistant
-            response = await process_message_with_assistant(message, client_id)
-            
-            # Send response back to client
-            await websocket.send_text(response)
+
+            # Replies are sent by the conversation's queue worker, keep reading meanwhile
+            if not turn_queue.submit(client_id, message, websocket):
+                logger.warning(f"Rejected message from client {client_id}, too many messages waiting")
+                notice = "Sorry, you're sending messages faster than I can answer. Please wait for my reply."
+                if STREAM_RESPONSES:
+                    await websocket.send_json({"type": "error", "message_id": uuid.uuid4().hex, "text": notice})
+                else:
+                    await websocket.send_text(notice)
             
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}", exc_info=True)
     finally:
+        open_connections.dec()
         await websocket.close()
         logger.info(f"WebSocket connection closed for client {client_id}")
 
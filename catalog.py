@@ -0,0 +1,309 @@
+"""
+Destination catalog: destinations, destination groups, themes and hotel facilities.
+
+The catalog is compiled once into an immutable `Catalog` (name indexes and destination
+bitsets). With CATALOG_PATH set it is loaded from a JSON or SQLite file and recompiled
+whenever that file changes; the new version replaces the old one with a single reference
+swap, so requests already holding a `Catalog` finish on the version they started with.
+Without CATALOG_PATH the catalog built into the *_mapping modules is used.
+
+Export the built-in catalog as a starting point for a data file:
+
+    python catalog.py export catalog.json
+    python catalog.py export catalog.sqlite3
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import argparse
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import mapping
+import destination_bitset
+import destination_group_mapping
+import destination_theme_mapping
+import hotel_facilities_mapping
+from destination_index import NameIndex, Match, DESTINATION_ALIASES, GROUP_ALIASES, THEME_ALIASES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sections of a catalog file, each a JSON object
+SECTIONS = {
+    "destinations": "destination name -> destination ID",
+    "destination_groups": "group name -> group ID",
+    "group_destinations": "group name -> list of destination names",
+    "destination_themes": "theme name -> theme ID",
+    "theme_destinations": "theme name -> list of destination names",
+    "hotel_facilities": "facility name -> facility ID"
+}
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def builtin_data() -> Dict[str, Any]:
+    return {
+        "version": "builtin",
+        "destinations": mapping.destination_mapping,
+        "destination_groups": destination_group_mapping.destination_group_mapping,
+        "group_destinations": destination_group_mapping.group_to_destinations,
+        "destination_themes": destination_theme_mapping.destination_theme_names,
+        "theme_destinations": destination_theme_mapping.theme_to_destinations,
+        "hotel_facilities": hotel_facilities_mapping.hotel_facilities_mapping
+    }
+
+
+def _read_json(path: str) -> Tuple[Dict[str, Any], bytes]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return json.loads(raw), raw
+
+
+def _read_sqlite(path: str) -> Tuple[Dict[str, Any], bytes]:
+    # Opened read-only and memory mapped, the writer swaps the file in with a rename
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        db.execute("PRAGMA mmap_size = 67108864")
+        data: Dict[str, Any] = {section: {} for section in SECTIONS}
+        for key, value in db.execute("SELECT key, value FROM catalog_meta"):
+            data[key] = value
+        for section, name, value in db.execute("SELECT section, name, value FROM catalog_entries ORDER BY rowid"):
+            data.setdefault(section, {})[name] = json.loads(value)
+    finally:
+        db.close()
+    return data, json.dumps(data, sort_keys=True).encode()
+
+
+def read_data(path: str) -> Dict[str, Any]:
+    """
+    Read and validate a catalog file. Files without a "version" are versioned by content hash.
+    """
+    data, raw = (_read_sqlite if path.endswith(SQLITE_SUFFIXES) else _read_json)(path)
+    if not isinstance(data, dict):
+        raise ValueError("catalog must be a JSON object")
+    for section in SECTIONS:
+        if not isinstance(data.get(section), dict):
+            raise ValueError(f"catalog section {section!r} is missing or not an object")
+    data.setdefault("version", hashlib.sha256(raw).hexdigest()[:12])
+    return data
+
+
+def write_data(path: str, data: Dict[str, Any]):
+    """
+    Write a catalog file, replacing any existing one atomically
+    """
+    temporary = f"{path}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+
+    if path.endswith(SQLITE_SUFFIXES):
+        db = sqlite3.connect(temporary)
+        with db:
+            db.execute("CREATE TABLE catalog_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            db.execute("CREATE TABLE catalog_entries (section TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (section, name))")
+            db.execute("INSERT INTO catalog_meta VALUES ('version', ?)", (str(data["version"]),))
+            db.executemany(
+                "INSERT INTO catalog_entries VALUES (?, ?, ?)",
+                [(section, name, json.dumps(value)) for section in SECTIONS for name, value in data[section].items()]
+            )
+        db.close()
+    else:
+        with open(temporary, "w") as f:
+            json.dump({key: data[key] for key in ("version", *SECTIONS)}, f, indent=2, ensure_ascii=False)
+
+    os.replace(temporary, path)
+
+
+class Catalog:
+    """
+    One compiled, read-only version of the catalog
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.version = str(data["version"])
+        self.destination_ids: Dict[str, int] = dict(data["destinations"])
+        self.group_ids: Dict[str, int] = dict(data["destination_groups"])
+        self.theme_ids: Dict[str, int] = dict(data["destination_themes"])
+        self.facility_ids: Dict[str, str] = dict(data["hotel_facilities"])
+
+        self.destinations = NameIndex(self.destination_ids, DESTINATION_ALIASES)
+        self.groups = NameIndex(self.group_ids, GROUP_ALIASES)
+        self.themes = NameIndex(self.theme_ids, THEME_ALIASES)
+
+        # Group and theme memberships as bitsets over destination IDs, see destination_bitset
+        self.group_bitsets = {group: self._bits(names) for group, names in data["group_destinations"].items()}
+        self.theme_bitsets = {theme: self._bits(names) for theme, names in data["theme_destinations"].items()}
+
+    def _bits(self, destination_names: Iterable[str]) -> int:
+        return destination_bitset.from_ids(
+            self.destination_ids[name] for name in destination_names if isinstance(self.destination_ids.get(name), int)
+        )
+
+    def _resolve(self, index: NameIndex, kind: str, name: str) -> Optional[Match]:
+        match = index.resolve(name)
+        if match is None:
+            logger.warning(f"Could not resolve {kind} name: {name!r}")
+        elif match.score < 1.0:
+            logger.info(f"Resolved {kind} {name!r} to {match.name!r} (score {match.score:.2f})")
+        return match
+
+    def match_destination(self, name: str) -> Optional[Match]:
+        return self._resolve(self.destinations, "destination", name)
+
+    def match_group(self, name: str) -> Optional[Match]:
+        return self._resolve(self.groups, "destination group", name)
+
+    def match_theme(self, name: str) -> Optional[Match]:
+        return self._resolve(self.themes, "destination theme", name)
+
+    def destination_ids_by_themes(self, themes: List[str]) -> Set[int]:
+        """
+        Destination IDs belonging to all of the given themes
+        """
+        if not themes:
+            return set()
+        bits = self.theme_bitsets.get(themes[0], 0)
+        for theme in themes[1:]:
+            bits &= self.theme_bitsets.get(theme, 0)
+        return set(destination_bitset.to_ids(bits))
+
+    def group_destination_ids(self, groups: Iterable[str]) -> Tuple[int, ...]:
+        """
+        Destination IDs belonging to any of the given groups
+        """
+        bits = 0
+        for group in groups:
+            bits |= self.group_bitsets.get(group, 0)
+        return destination_bitset.to_ids(bits)
+
+    def facility_ids_for(self, facility_names: List[str]) -> List[str]:
+        return [self.facility_ids[name] for name in facility_names if name in self.facility_ids]
+
+
+class CatalogStore:
+    """
+    Holds the current `Catalog` and reloads it when the catalog file changes.
+
+    Files are read and compiled in a worker thread, a file that fails to load or
+    validate is logged and the previous version stays in service.
+    """
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._current = Catalog(builtin_data())
+        self._signature: Optional[Tuple[int, int]] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+        self._stats = {
+            "loaded_at": time.time(),
+            "reloads": 0,
+            "failures": 0,
+            "last_error": None
+        }
+
+    def current(self) -> Catalog:
+        return self._current
+
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> bool:
+        """
+        Load the catalog file if it changed since the last load, True if a new version was swapped in
+        """
+        if not self.path:
+            return False
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+
+        try:
+            catalog = Catalog(read_data(self.path))
+        except Exception as e:
+            self._signature = signature
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(e)
+            logger.error(f"Could not load catalog from {self.path}, keeping version {self._current.version}: {e}")
+            return False
+
+        previous, self._current, self._signature = self._current, catalog, signature
+        self._stats["reloads"] += 1
+        self._stats["loaded_at"] = time.time()
+        self._stats["last_error"] = None
+        logger.info(f"Catalog version {catalog.version} loaded from {self.path} (was {previous.version})")
+        return True
+
+    async def reload(self) -> bool:
+        return await asyncio.to_thread(self.load)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Catalog watcher error: {e}")
+
+    async def start(self):
+        """
+        Load the catalog file and start watching it for changes
+        """
+        if not self.path:
+            return
+        await self.reload()
+        if self._watcher is None and self.reload_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        catalog = self._current
+        return {
+            **self._stats,
+            "path": self.path,
+            "version": catalog.version,
+            "destinations": len(catalog.destination_ids),
+            "groups": len(catalog.group_ids),
+            "themes": len(catalog.theme_ids)
+        }
+
+
+store = CatalogStore(
+    path=os.getenv("CATALOG_PATH") or None,
+    reload_interval=float(os.getenv("CATALOG_RELOAD_INTERVAL", "5"))
+)
+
+
+def current() -> Catalog:
+    return store.current()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the built-in catalog to a .json or .sqlite3 file")
+    export.add_argument("path")
+    export.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    args = parser.parse_args()
+
+    data = builtin_data()
+    data["version"] = args.version
+    write_data(args.path, data)
+    print(f"Wrote catalog version {args.version} to {args.path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
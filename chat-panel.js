@@ -235,11 +235,52 @@
         };
 
         ws.onmessage = (event) => {
-            elements.typingIndicator.classList.remove('active');
-            addMessage(event.data, 'bot');
+            handleServerMessage(event.data);
         };
     }
 
+    // Bot messages currently being streamed, keyed by message_id
+    const streamingMessages = {};
+
+    // Render a server message: either plain text or a start/delta/end/error frame
+    function handleServerMessage(data) {
+        let frame = null;
+        try {
+            frame = JSON.parse(data);
+        } catch (e) {
+            frame = null;
+        }
+
+        if (!frame || typeof frame !== 'object' || !frame.type) {
+            elements.typingIndicator.classList.remove('active');
+            addMessage(data, 'bot');
+            return;
+        }
+
+        switch (frame.type) {
+            case 'start':
+                break;
+            case 'delta':
+                elements.typingIndicator.classList.remove('active');
+                if (!streamingMessages[frame.message_id]) {
+                    streamingMessages[frame.message_id] = addMessage('', 'bot');
+                }
+                streamingMessages[frame.message_id].textContent += frame.text;
+                elements.messages.scrollTop = elements.messages.scrollHeight;
+                break;
+            case 'end':
+            case 'error':
+                elements.typingIndicator.classList.remove('active');
+                if (streamingMessages[frame.message_id]) {
+                    streamingMessages[frame.message_id].textContent = frame.text;
+                } else {
+                    addMessage(frame.text, 'bot');
+                }
+                delete streamingMessages[frame.message_id];
+                break;
+        }
+    }
+
     // Add message to chat
     function addMessage(text, sender) {
         const messageDiv = document.createElement('div');
@@ -247,6 +288,7 @@
         messageDiv.textContent = text;
         elements.messages.insertBefore(messageDiv, elements.typingIndicator);
         elements.messages.scrollTop = elements.messages.scrollHeight;
+        return messageDiv;
     }
 
     // Send message
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def definition_hash(definition: Dict[str, Any]) -> str:
+    payload = json.dumps(definition, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AssistantProvisioner:
+    """
+    Resolves the assistant the bot runs against without holding up startup.
+
+    The assistant ID and the hash of the definition (instructions, model, tools) it was
+    last synced with are kept in a small JSON cache file. If the cached hash matches the
+    current definition the cached ID is used without any API call. Otherwise the known
+    assistant is updated to the current definition, or a new one is created when there
+    is none, and the cache is rewritten.
+
+    `ensure()` provisions on first use and is shared by concurrent callers, `start()`
+    does the same in the background, retrying failures with backoff.
+    """
+
+    def __init__(self, client, definition: Dict[str, Any], assistant_id: Optional[str] = None,
+                 cache_path: Optional[str] = None, retry_interval: float = 2.0, max_retry_interval: float = 60.0,
+                 on_created: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.definition = definition
+        self.definition_hash = definition_hash(definition)
+        self.configured_id = assistant_id
+        self.cache_path = cache_path
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.on_created = on_created
+
+        self.assistant_id: Optional[str] = None
+        self.state = "pending"
+        self.source: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.attempts = 0
+        self.resolved_in: Optional[float] = None
+
+        self._task: Optional[asyncio.Task] = None
+        self._background: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.assistant_id is not None
+
+    async def ensure(self) -> str:
+        """
+        Return the assistant ID, provisioning it first if needed
+        """
+        if self.assistant_id is not None:
+            return self.assistant_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._provision())
+        # Shielded so a cancelled caller doesn't abort provisioning for everyone else
+        return await asyncio.shield(self._task)
+
+    def start(self):
+        """
+        Provision in the background, retrying with backoff until it succeeds
+        """
+        if self._background is None and not self.ready:
+            self._background = asyncio.create_task(self._provision_until_ready())
+
+    async def stop(self):
+        if self._background is not None:
+            self._background.cancel()
+            self._background = None
+
+    async def _provision_until_ready(self):
+        delay = self.retry_interval
+        while not self.ready:
+            try:
+                await self.ensure()
+            except Exception:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_interval)
+
+    async def _provision(self) -> str:
+        started = time.monotonic()
+        self.state = "provisioning"
+        self.attempts += 1
+        try:
+            assistant_id, source = await self._resolve()
+        except Exception as e:
+            self.state = "failed"
+            self.last_error = str(e)
+            logger.error(f"Could not provision assistant (attempt {self.attempts}): {e}")
+            raise
+
+        self.assistant_id, self.source, self.state, self.last_error = assistant_id, source, "ready", None
+        self.resolved_in = time.monotonic() - started
+        logger.info(f"Assistant {assistant_id} ready ({source}, {self.resolved_in * 1000:.0f} ms)")
+        return assistant_id
+
+    async def _resolve(self):
+        cached = self._read_cache()
+        cached_id = cached.get("assistant_id")
+        if cached_id and cached.get("definition_hash") == self.definition_hash and self.configured_id in (None, cached_id):
+            return cached_id, "cache"
+
+        assistant_id = self.configured_id or cached_id
+        if assistant_id:
+            try:
+                # Bring the existing assistant in line with the current definition
+                await self.client.beta.assistants.update(assistant_id, **self.definition)
+                self._write_cache(assistant_id)
+                return assistant_id, "updated"
+            except Exception as e:
+                if getattr(e, "status_code", None) != 404:
+                    raise
+                logger.warning(f"Could not find assistant with ID {assistant_id}, creating a new one")
+
+        logger.info("Creating new assistant")
+        assistant = await self.client.beta.assistants.create(**self.definition)
+        self._write_cache(assistant.id)
+        if self.on_created is not None:
+            self.on_created(assistant.id)
+        return assistant.id, "created"
+
+    def _read_cache(self) -> Dict[str, Any]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            return cached if isinstance(cached, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable assistant cache {self.cache_path}: {e}")
+            return {}
+
+    def _write_cache(self, assistant_id: str):
+        if not self.cache_path:
+            return
+        temporary = f"{self.cache_path}.tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump({"assistant_id": assistant_id, "definition_hash": self.definition_hash, "synced_at": time.time()}, f)
+            os.replace(temporary, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write assistant cache {self.cache_path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "assistant_id": self.assistant_id,
+            "source": self.source,
+            "attempts": self.attempts,
+            "resolved_in_ms": None if self.resolved_in is None else round(self.resolved_in * 1000, 1),
+            "last_error": self.last_error,
+            "definition_hash": self.definition_hash[:12]
+        }
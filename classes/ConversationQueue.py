@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# handler(conversation_id, messages, reply_targets)
+TurnHandler = Callable[[str, List[str], List[Any]], Awaitable[None]]
+
+
+class ConversationQueue:
+    """
+    Per-conversation work queue that runs one turn at a time and merges bursts.
+
+    `submit()` returns right away. The first message of a conversation starts a worker
+    that waits `coalesce_window` seconds for more messages, then hands everything pending
+    (at most `max_batch` messages) to `handler` as a single turn. Messages that arrive
+    while a turn is running are merged into the next one. The worker exits once the
+    queue is empty, so idle conversations cost nothing.
+
+    Each message carries a reply target (e.g. its WebSocket). The handler gets the
+    distinct targets of the merged messages, in arrival order. `on_wait`, if given, is
+    called with the seconds each message was queued before its turn started.
+
+    At most `max_pending` messages wait per conversation. Further messages are rejected
+    (`submit()` returns False) until the queue drains, so a flooding client can't queue
+    unbounded work.
+    """
+
+    def __init__(self, handler: TurnHandler, coalesce_window: float = 0.25, max_batch: int = 10,
+                 max_pending: int = 20, on_wait: Optional[Callable[[float], None]] = None):
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.on_wait = on_wait
+
+        self._pending: Dict[str, List[Tuple[str, Any, float]]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        self._stats = {
+            "messages": 0,
+            "turns": 0,
+            "coalesced_messages": 0,
+            "largest_batch": 0,
+            "handler_errors": 0,
+            "rejected_messages": 0
+        }
+
+    def submit(self, conversation_id: str, message: str, reply_target: Any) -> bool:
+        """
+        Queue a message, False if the conversation already has `max_pending` messages waiting
+        """
+        pending = self._pending.setdefault(conversation_id, [])
+        if len(pending) >= self.max_pending:
+            self._stats["rejected_messages"] += 1
+            return False
+        self._stats["messages"] += 1
+        pending.append((message, reply_target, time.monotonic()))
+        if conversation_id not in self._workers:
+            self._workers[conversation_id] = asyncio.create_task(self._work(conversation_id))
+        return True
+
+    async def _work(self, conversation_id: str):
+        try:
+            while self._pending.get(conversation_id):
+                if self.coalesce_window > 0:
+                    await asyncio.sleep(self.coalesce_window)
+
+                pending = self._pending[conversation_id]
+                batch, self._pending[conversation_id] = pending[:self.max_batch], pending[self.max_batch:]
+                messages = [message for message, _, _ in batch]
+                targets = list({id(target): target for _, target, _ in batch}.values())
+                if self.on_wait is not None:
+                    now = time.monotonic()
+                    for _, _, queued_at in batch:
+                        self.on_wait(now - queued_at)
+
+                self._stats["turns"] += 1
+                self._stats["coalesced_messages"] += len(batch) - 1
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+                if len(batch) > 1:
+                    logger.info(f"Merged {len(batch)} messages into one turn for conversation {conversation_id}")
+
+                try:
+                    await self.handler(conversation_id, messages, targets)
+                except Exception as e:
+                    self._stats["handler_errors"] += 1
+                    logger.error(f"Turn failed for conversation {conversation_id}: {e}", exc_info=True)
+        finally:
+            self._pending.pop(conversation_id, None)
+            self._workers.pop(conversation_id, None)
+
+    async def stop(self):
+        for worker in list(self._workers.values()):
+            worker.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "active_conversations": len(self._workers),
+            "queued_messages": sum(len(pending) for pending in self._pending.values())
+        }
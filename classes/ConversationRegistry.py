@@ -0,0 +1,136 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    __slots__ = ("thread_id", "last_active", "run_id")
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.last_active = time.monotonic()
+        self.run_id: Optional[str] = None
+
+
+class ConversationRegistry:
+    """
+    Bounded map of conversation ID -> Session (OpenAI thread, last activity, in-flight run).
+
+    Sessions are kept in least recently used order. Once more than `max_sessions` are
+    registered the least recently used one is dropped, and sessions idle for longer than
+    `idle_ttl` seconds are dropped on access and by `sweep()`. Sessions with a run in
+    flight are never evicted. A conversation whose session was evicted starts a new thread.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 6 * 3600):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "created": 0,
+            "lru_evictions": 0,
+            "idle_evictions": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return session.run_id is None and now - session.last_active > self.idle_ttl
+
+    def get(self, conversation_id: str) -> Optional[Session]:
+        session = self._sessions.get(conversation_id)
+        now = time.monotonic()
+        if session is not None and self._expired(session, now):
+            del self._sessions[conversation_id]
+            self._stats["idle_evictions"] += 1
+            session = None
+        if session is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        session.last_active = now
+        self._sessions.move_to_end(conversation_id)
+        return session
+
+    def add(self, conversation_id: str, thread_id: str) -> Session:
+        session = Session(thread_id)
+        self._sessions[conversation_id] = session
+        self._sessions.move_to_end(conversation_id)
+        self._stats["created"] += 1
+        self._evict_overflow()
+        return session
+
+    def set_run(self, conversation_id: str, run_id: Optional[str]):
+        session = self._sessions.get(conversation_id)
+        if session is not None:
+            session.run_id = run_id
+            session.last_active = time.monotonic()
+
+    def _evict_overflow(self):
+        # Busy sessions found at the cold end are moved back once, so this stops after one pass
+        for _ in range(len(self._sessions)):
+            if len(self._sessions) <= self.max_sessions:
+                return
+            conversation_id, session = next(iter(self._sessions.items()))
+            if session.run_id is not None:
+                self._sessions.move_to_end(conversation_id)
+                continue
+            del self._sessions[conversation_id]
+            self._stats["lru_evictions"] += 1
+
+    def sweep(self) -> int:
+        """
+        Drop idle sessions, oldest first, stopping at the first one still in use
+        """
+        now = time.monotonic()
+        evicted = 0
+        while self._sessions:
+            conversation_id, session = next(iter(self._sessions.items()))
+            if now - session.last_active <= self.idle_ttl:
+                break
+            if session.run_id is not None:
+                session.last_active = now
+                self._sessions.move_to_end(conversation_id)
+                continue
+            del self._sessions[conversation_id]
+            evicted += 1
+        self._stats["idle_evictions"] += evicted
+        return evicted
+
+    async def _sweep_periodically(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.sweep()
+            if evicted:
+                logger.info(f"Evicted {evicted} idle conversations, {len(self._sessions)} active")
+
+    def start(self, interval: float = 60.0):
+        """
+        Sweep idle sessions every `interval` seconds in the background
+        """
+        if self._sweeper is None and interval > 0:
+            self._sweeper = asyncio.create_task(self._sweep_periodically(interval))
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "runs_in_flight": sum(1 for session in self._sessions.values() if session.run_id is not None)
+        }
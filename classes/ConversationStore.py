@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from classes.ConversationRegistry import ConversationRegistry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _KeyedLocks:
+    """
+    One asyncio.Lock per key, dropped again once nobody holds or waits for it
+    """
+
+    def __init__(self):
+        self._locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(key) or (asyncio.Lock(), 0)
+        self._locks[key] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+class ConversationStore(ABC):
+    """
+    Shared conversation state: which OpenAI thread belongs to a conversation, plus a
+    per-conversation lock so only one turn runs on a thread at a time.
+
+    Backends implement the thread mapping and a lock that excludes every worker sharing
+    the store. The in-process ConversationRegistry stays in front as a cache.
+
+    A conversation answered without a thread (fast path, response cache) has a seed
+    instead: the messages its thread starts with if the user continues, on any worker.
+    """
+
+    @abstractmethod
+    async def get_thread(self, conversation_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def set_thread(self, conversation_id: str, thread_id: str):
+        pass
+
+    @abstractmethod
+    async def touch(self, conversation_id: str):
+        pass
+
+    @abstractmethod
+    def lock(self, conversation_id: str):
+        """
+        Async context manager held for the duration of a turn
+        """
+
+    @abstractmethod
+    async def get_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        """
+        Messages the conversation's thread should start with, empty if there are none
+        """
+
+    @abstractmethod
+    async def set_seed(self, conversation_id: str, messages: List[Dict[str, str]]):
+        pass
+
+    @abstractmethod
+    async def take_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        """
+        Remove and return the conversation's seed, called under its lock when the thread is created
+        """
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    async def close(self):
+        pass
+
+
+class MemoryConversationStore(ConversationStore):
+    """
+    Process-local store, for a single worker. Threads are kept in a ConversationRegistry,
+    so at most `max_sessions` conversations are held (least recently used dropped first)
+    and idle ones expire when they are next accessed.
+    """
+
+    def __init__(self, idle_ttl: float = 6 * 3600, max_sessions: int = 10000):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._threads = ConversationRegistry(max_sessions=max_sessions, idle_ttl=idle_ttl)
+        self._seeds: "OrderedDict[str, Tuple[List[Dict[str, str]], float]]" = OrderedDict()
+        self._locks = _KeyedLocks()
+
+    async def get_thread(self, conversation_id: str) -> Optional[str]:
+        session = self._threads.get(conversation_id)
+        return session.thread_id if session is not None else None
+
+    async def set_thread(self, conversation_id: str, thread_id: str):
+        self._threads.add(conversation_id, thread_id)
+
+    async def touch(self, conversation_id: str):
+        self._threads.get(conversation_id)
+
+    def lock(self, conversation_id: str):
+        return self._locks.hold(conversation_id)
+
+    async def get_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        entry = self._seeds.get(conversation_id)
+        if entry is None:
+            return []
+        if time.monotonic() - entry[1] > self.idle_ttl:
+            del self._seeds[conversation_id]
+            return []
+        return entry[0]
+
+    async def set_seed(self, conversation_id: str, messages: List[Dict[str, str]]):
+        self._seeds[conversation_id] = (messages, time.monotonic())
+        self._seeds.move_to_end(conversation_id)
+        while len(self._seeds) > self.max_sessions:
+            self._seeds.popitem(last=False)
+
+    async def take_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        seed = await self.get_seed(conversation_id)
+        self._seeds.pop(conversation_id, None)
+        return seed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "conversations": len(self._threads), "seeds": len(self._seeds), "locks_held": len(self._locks)}
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Store in a SQLite file shared by all workers on a host (WAL mode).
+
+    Locks are leases: a row in conversation_locks owned by one worker until it is released
+    or `lease` seconds pass without renewal, so a crashed worker can't block a conversation
+    for good. The holder renews its lease every `lease / 3` seconds. Waiters in the same
+    process queue on an asyncio lock first and only then poll the table.
+    """
+
+    def __init__(self, path: str, idle_ttl: float = 6 * 3600, lease: float = 60.0, poll_interval: float = 0.05):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._local_locks = _KeyedLocks()
+        self._owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._stats = {
+            "lock_acquisitions": 0,
+            "lock_waits": 0,
+            "lock_wait_seconds": 0.0,
+            "lease_takeovers": 0
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "conversation_id TEXT PRIMARY KEY, thread_id TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_locks ("
+                "conversation_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_seeds ("
+                "conversation_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS conversation_seeds_updated_at ON conversation_seeds (updated_at)")
+            self._db.commit()
+        return self._db
+
+    def _execute(self, sql: str, params: tuple = ()) -> Tuple[Optional[tuple], int]:
+        with self._db_lock:
+            db = self._connection()
+            cursor = db.execute(sql, params)
+            row = cursor.fetchone()
+            db.commit()
+            return row, cursor.rowcount
+
+    async def get_thread(self, conversation_id: str) -> Optional[str]:
+        row, _ = await asyncio.to_thread(
+            self._execute,
+            "SELECT thread_id FROM conversations WHERE conversation_id = ? AND updated_at >= ?",
+            (conversation_id, time.time() - self.idle_ttl)
+        )
+        return row[0] if row else None
+
+    async def set_thread(self, conversation_id: str, thread_id: str):
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO conversations (conversation_id, thread_id, updated_at) VALUES (?, ?, ?)",
+            (conversation_id, thread_id, now)
+        )
+        await asyncio.to_thread(self._execute, "DELETE FROM conversations WHERE updated_at < ?", (now - self.idle_ttl,))
+
+    async def touch(self, conversation_id: str):
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE conversations SET updated_at = ? WHERE conversation_id = ?",
+            (time.time(), conversation_id)
+        )
+
+    async def get_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        row, _ = await asyncio.to_thread(
+            self._execute,
+            "SELECT messages FROM conversation_seeds WHERE conversation_id = ? AND updated_at >= ?",
+            (conversation_id, time.time() - self.idle_ttl)
+        )
+        return json.loads(row[0]) if row else []
+
+    async def set_seed(self, conversation_id: str, messages: List[Dict[str, str]]):
+        now = time.time()
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO conversation_seeds (conversation_id, messages, updated_at) VALUES (?, ?, ?)",
+            (conversation_id, json.dumps(messages), now)
+        )
+        await asyncio.to_thread(self._execute, "DELETE FROM conversation_seeds WHERE updated_at < ?", (now - self.idle_ttl,))
+
+    def _take_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute(
+                "SELECT messages FROM conversation_seeds WHERE conversation_id = ? AND updated_at >= ?",
+                (conversation_id, time.time() - self.idle_ttl)
+            ).fetchone()
+            db.execute("DELETE FROM conversation_seeds WHERE conversation_id = ?", (conversation_id,))
+            db.commit()
+            return json.loads(row[0]) if row else []
+
+    async def take_seed(self, conversation_id: str) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._take_seed, conversation_id)
+
+    def _try_acquire(self, conversation_id: str, owner: str) -> Tuple[bool, bool]:
+        now = time.time()
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute("SELECT expires_at FROM conversation_locks WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            cursor = db.execute(
+                "INSERT INTO conversation_locks (conversation_id, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE conversation_locks.expires_at < ?",
+                (conversation_id, owner, now + self.lease, now)
+            )
+            db.commit()
+            return cursor.rowcount == 1, row is not None
+
+    async def _renew(self, conversation_id: str, owner: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            _, renewed = await asyncio.to_thread(
+                self._execute,
+                "UPDATE conversation_locks SET expires_at = ? WHERE conversation_id = ? AND owner = ?",
+                (time.time() + self.lease, conversation_id, owner)
+            )
+            if not renewed:
+                logger.warning(f"Lost the lock on conversation {conversation_id}")
+                return
+
+    @asynccontextmanager
+    async def lock(self, conversation_id: str) -> AsyncIterator[None]:
+        async with self._local_locks.hold(conversation_id):
+            owner = f"{self._owner_prefix}:{uuid.uuid4().hex}"
+            started = time.monotonic()
+            waited = False
+            while True:
+                acquired, existed = await asyncio.to_thread(self._try_acquire, conversation_id, owner)
+                if acquired:
+                    break
+                waited = True
+                await asyncio.sleep(self.poll_interval)
+
+            self._stats["lock_acquisitions"] += 1
+            if waited:
+                self._stats["lock_waits"] += 1
+                self._stats["lock_wait_seconds"] += time.monotonic() - started
+            if existed:
+                # The previous holder's lease ran out without a release
+                self._stats["lease_takeovers"] += 1
+
+            renewer = asyncio.create_task(self._renew(conversation_id, owner))
+            try:
+                yield
+            finally:
+                renewer.cancel()
+                await asyncio.shield(asyncio.to_thread(
+                    self._execute,
+                    "DELETE FROM conversation_locks WHERE conversation_id = ? AND owner = ?",
+                    (conversation_id, owner)
+                ))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "lock_wait_seconds": round(self._stats["lock_wait_seconds"], 3),
+            "backend": "sqlite",
+            "path": self.path,
+            "locks_held": len(self._local_locks)
+        }
+
+    async def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def from_env(idle_ttl: float, max_sessions: int = 10000) -> ConversationStore:
+    """
+    Store selected by CONVERSATION_STORE: "sqlite" (default) or "memory"
+    """
+    backend = os.getenv("CONVERSATION_STORE", "sqlite").lower()
+    if backend == "memory":
+        return MemoryConversationStore(idle_ttl=idle_ttl, max_sessions=max_sessions)
+    if backend == "sqlite":
+        return SQLiteConversationStore(
+            os.getenv("CONVERSATION_STORE_PATH", "conversations.sqlite3"),
+            idle_ttl=idle_ttl,
+            lease=float(os.getenv("CONVERSATION_LOCK_LEASE", "60"))
+        )
+    raise ValueError(f"Unknown CONVERSATION_STORE backend: {backend}")
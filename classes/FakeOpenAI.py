@@ -0,0 +1,274 @@
+import json
+import asyncio
+import logging
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import catalog
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses in which a run blocks new runs on its thread
+ACTIVE_STATUSES = ("queued", "in_progress", "requires_action", "cancelling")
+
+
+class NotFoundError(Exception):
+    # Same status the real client's NotFoundError carries
+    status_code = 404
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex[:24]}"
+
+
+def _text_message(role: str, text: str, run_id: Optional[str] = None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=_new_id("msg"),
+        role=role,
+        run_id=run_id,
+        created_at=time.time(),
+        content=[SimpleNamespace(type="text", text=SimpleNamespace(value=text))]
+    )
+
+
+class _Stream:
+    """
+    Run events like the real client's AsyncStream: iterated with `async for`, closed
+    with close() or by `async with`. `open_streams` of the fake counts the unclosed ones.
+    """
+
+    def __init__(self, fake: "FakeAsyncOpenAI", events):
+        self._fake = fake
+        self._events = events
+        self._closed = False
+        fake.open_streams += 1
+
+    def __aiter__(self):
+        return self._events.__aiter__()
+
+    async def __aenter__(self) -> "_Stream":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self._fake.open_streams -= 1
+            await self._events.aclose()
+
+
+class FakeAsyncOpenAI:
+    """
+    In-process stand-in for AsyncOpenAI covering the Assistants calls the bot uses.
+    Every call sleeps for `latency` seconds to simulate a network round trip, so
+    concurrency behaviour can be checked locally without an API key.
+    """
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.assistants: Dict[str, SimpleNamespace] = {}
+        self.threads: Dict[str, List[SimpleNamespace]] = {}
+        self.runs: Dict[str, SimpleNamespace] = {}
+        self.open_streams = 0
+        self.beta = SimpleNamespace(
+            assistants=_Assistants(self),
+            threads=_Threads(self)
+        )
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency)
+
+
+class _Assistants:
+    def __init__(self, fake: FakeAsyncOpenAI):
+        self._fake = fake
+
+    async def retrieve(self, assistant_id: str) -> SimpleNamespace:
+        await self._fake._round_trip()
+        if assistant_id not in self._fake.assistants:
+            raise NotFoundError(f"No assistant found with id '{assistant_id}'")
+        return self._fake.assistants[assistant_id]
+
+    async def update(self, assistant_id: str, **kwargs) -> SimpleNamespace:
+        await self._fake._round_trip()
+        if assistant_id not in self._fake.assistants:
+            raise NotFoundError(f"No assistant found with id '{assistant_id}'")
+        self._fake.assistants[assistant_id].__dict__.update(kwargs)
+        return self._fake.assistants[assistant_id]
+
+    async def create(self, **kwargs) -> SimpleNamespace:
+        await self._fake._round_trip()
+        assistant = SimpleNamespace(id=_new_id("asst"), **kwargs)
+        self._fake.assistants[assistant.id] = assistant
+        return assistant
+
+
+class _Threads:
+    def __init__(self, fake: FakeAsyncOpenAI):
+        self._fake = fake
+        self.messages = _Messages(fake)
+        self.runs = _Runs(fake)
+
+    async def create(self) -> SimpleNamespace:
+        await self._fake._round_trip()
+        thread = SimpleNamespace(id=_new_id("thread"))
+        self._fake.threads[thread.id] = []
+        return thread
+
+    async def retrieve(self, thread_id: str) -> SimpleNamespace:
+        await self._fake._round_trip()
+        if thread_id not in self._fake.threads:
+            raise Exception(f"No thread found with id '{thread_id}'")
+        return SimpleNamespace(id=thread_id)
+
+    async def create_and_run(self, assistant_id: str, thread: Optional[Dict[str, Any]] = None, stream: bool = False):
+        thread_id = _new_id("thread")
+        self._fake.threads[thread_id] = [
+            _text_message(message["role"], message["content"]) for message in (thread or {}).get("messages", [])
+        ]
+        return await self.runs.create(thread_id, assistant_id, stream=stream)
+
+
+class _Messages:
+    def __init__(self, fake: FakeAsyncOpenAI):
+        self._fake = fake
+
+    async def create(self, thread_id: str, role: str, content: str) -> SimpleNamespace:
+        await self._fake._round_trip()
+        message = _text_message(role, content)
+        self._fake.threads[thread_id].append(message)
+        return message
+
+    async def list(self, thread_id: str, run_id: Optional[str] = None, order: str = "desc", limit: int = 20) -> SimpleNamespace:
+        await self._fake._round_trip()
+        messages = [message for message in self._fake.threads[thread_id] if run_id is None or message.run_id == run_id]
+        # Newest first by default, like the real API
+        if order == "desc":
+            messages.reverse()
+        return SimpleNamespace(data=messages[:limit])
+
+
+class _Runs:
+    """
+    Runs advance one state per retrieve: queued -> in_progress -> completed.
+    If the last user message names a known destination the run stops in
+    requires_action with a makeSearch tool call until outputs are submitted.
+    With stream=True the same progression is delivered as run events, and the
+    reply text arrives as a series of thread.message.delta events.
+    """
+
+    def __init__(self, fake: FakeAsyncOpenAI):
+        self._fake = fake
+
+    async def create(self, thread_id: str, assistant_id: str, additional_messages: Optional[List[Dict[str, Any]]] = None, stream: bool = False):
+        await self._fake._round_trip()
+        # Like the real API, a thread runs one run at a time
+        for other in self._fake.runs.values():
+            if other.thread_id == thread_id and other.status in ACTIVE_STATUSES:
+                raise Exception(f"Thread {thread_id} already has an active run {other.id}")
+        for message in additional_messages or []:
+            self._fake.threads[thread_id].append(_text_message(message["role"], message["content"]))
+        run = SimpleNamespace(
+            id=_new_id("run"),
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            status="queued",
+            required_action=None,
+            last_error=None,
+            tool_outputs=None
+        )
+        self._fake.runs[run.id] = run
+        if stream:
+            return _Stream(self._fake, self._stream(run))
+        return run
+
+    async def retrieve(self, thread_id: str, run_id: str) -> SimpleNamespace:
+        await self._fake._round_trip()
+        run = self._fake.runs[run_id]
+        if run.status == "queued":
+            run.status = "in_progress"
+        elif run.status == "in_progress":
+            self._advance(run)
+        return run
+
+    async def cancel(self, thread_id: str, run_id: str) -> SimpleNamespace:
+        await self._fake._round_trip()
+        run = self._fake.runs[run_id]
+        if run.status not in ACTIVE_STATUSES:
+            raise Exception(f"Cannot cancel run {run_id} with status {run.status}")
+        run.status = "cancelled"
+        run.required_action = None
+        return run
+
+    async def submit_tool_outputs(self, thread_id: str, run_id: str, tool_outputs: List[Dict[str, Any]], stream: bool = False):
+        await self._fake._round_trip()
+        run = self._fake.runs[run_id]
+        if run.status != "requires_action":
+            raise Exception(f"Run {run_id} is not waiting for tool outputs")
+        run.tool_outputs = (run.tool_outputs or []) + list(tool_outputs)
+        run.required_action = None
+        run.status = "in_progress"
+        if stream:
+            return _Stream(self._fake, self._stream(run))
+        return run
+
+    async def _stream(self, run: SimpleNamespace):
+        if run.status == "queued":
+            yield SimpleNamespace(event="thread.run.created", data=run)
+            run.status = "in_progress"
+        yield SimpleNamespace(event="thread.run.in_progress", data=run)
+
+        await self._fake._round_trip()
+        reply = self._advance(run)
+        if run.status == "requires_action":
+            yield SimpleNamespace(event="thread.run.requires_action", data=run)
+            return
+
+        words = reply.split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self._fake.latency / 10)
+            chunk = word if index == len(words) - 1 else word + " "
+            yield SimpleNamespace(
+                event="thread.message.delta",
+                data=SimpleNamespace(delta=SimpleNamespace(content=[
+                    SimpleNamespace(index=0, type="text", text=SimpleNamespace(value=chunk))
+                ]))
+            )
+        yield SimpleNamespace(event="thread.run.completed", data=run)
+
+    def _advance(self, run: SimpleNamespace) -> Optional[str]:
+        user_text = self._last_user_text(run.thread_id)
+        destinations = [name for name in catalog.current().destination_ids if name.strip().lower() in user_text.lower()]
+
+        if destinations and run.tool_outputs is None:
+            run.status = "requires_action"
+            run.required_action = SimpleNamespace(
+                submit_tool_outputs=SimpleNamespace(tool_calls=[SimpleNamespace(
+                    id=_new_id("call"),
+                    type="function",
+                    function=SimpleNamespace(
+                        name="makeSearch",
+                        arguments=json.dumps({"destinationNames": destinations})
+                    )
+                )])
+            )
+            return None
+
+        if run.tool_outputs:
+            reply = f"Here is what I found: {run.tool_outputs[-1]['output']}"
+        else:
+            reply = f"You said: {user_text}"
+        self._fake.threads[run.thread_id].append(_text_message("assistant", reply, run.id))
+        run.status = "completed"
+        return reply
+
+    def _last_user_text(self, thread_id: str) -> str:
+        for message in reversed(self._fake.threads[thread_id]):
+            if message.role == "user":
+                return message.content[0].text.value
+        return ""
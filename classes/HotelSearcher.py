@@ -1,11 +1,13 @@
 import json
 import logging
-import requests
+import httpx
+import classes.HttpClient as HttpClient
+import classes.SearchCache as SearchCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def searchHotels(search_params: str) -> str:
+async def searchHotels(search_params: str) -> str:
     logger.info(f"Making search with params: {search_params}")
     # Extract relevant parameters for API call
     api_params = {
@@ -15,6 +17,9 @@ def searchHotels(search_params: str) -> str:
         "preferences": search_params.get("preferences", [])
     }
 
+    return await SearchCache.cached("hotels", api_params, lambda: _fetch_hotels(api_params))
+
+async def _fetch_hotels(api_params: dict) -> dict:
     # Construct API URL with parameters
     base_url = "https://www.holidayheroes.de/app_dev.php/api_no_auth/holiday_finder/offers-v2/"
     query_params = f"?data={json.dumps(api_params)}"
@@ -23,10 +28,10 @@ def searchHotels(search_params: str) -> str:
     logger.info(f"Making API request to: {url}")
     
     try:
-        response = requests.get(url)
+        response = await HttpClient.get(url)
         response.raise_for_status()  # Raise an exception for bad status codes
         return response.json()
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"API request failed: {str(e)}")
         raise Exception(f"Failed to fetch holiday offers: {str(e)}")
     
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pool sizing, all overridable from the environment
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "20"))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP2 = os.getenv("HTTP_HTTP2", "").lower() in ("1", "true", "yes")
+
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+_stats: Dict[str, Any] = {
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "host_limit_waits": 0,
+    "hosts": {}
+}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared AsyncClient, creating it on first use
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = HTTP2 and _http2_available()
+        if HTTP2 and not http2:
+            logger.warning("HTTP_HTTP2 is set but the 'h2' package is not installed, falling back to HTTP/1.1")
+
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+    return _client
+
+
+@asynccontextmanager
+async def _host_slot(url: str) -> AsyncIterator[None]:
+    """
+    Hold one of the host's PER_HOST_LIMIT slots and account for the request
+    """
+    host = urlsplit(url).netloc
+    slots = _host_slots.setdefault(host, asyncio.Semaphore(PER_HOST_LIMIT))
+    host_stats = _stats["hosts"].setdefault(host, {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0})
+
+    if slots.locked():
+        _stats["host_limit_waits"] += 1
+
+    async with slots:
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        host_stats["requests"] += 1
+        host_stats["in_flight"] += 1
+        host_stats["peak_in_flight"] = max(host_stats["peak_in_flight"], host_stats["in_flight"])
+        try:
+            yield
+        except httpx.HTTPError:
+            _stats["errors"] += 1
+            host_stats["errors"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+            host_stats["in_flight"] -= 1
+
+
+async def get(url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> httpx.Response:
+    """
+    GET through the shared pool, holding one of the host's PER_HOST_LIMIT slots
+    """
+    async with _host_slot(url):
+        return await get_client().get(url, params=params, **kwargs)
+
+
+@asynccontextmanager
+async def stream(url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncIterator[httpx.Response]:
+    """
+    Streaming GET: the body is not read up front, consume it with response.aiter_bytes()
+    """
+    async with _host_slot(url):
+        async with get_client().stream("GET", url, params=params, **kwargs) as response:
+            yield response
+
+
+def stats() -> Dict[str, Any]:
+    """
+    Request counters plus the current state of the connection pool
+    """
+    connections = []
+    if _client is not None:
+        # httpx doesn't expose its pool publicly, read it defensively
+        pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+
+    return {
+        **_stats,
+        "hosts": {host: dict(values) for host, values in _stats["hosts"].items()},
+        "connections_open": len(connections),
+        "connections_idle": sum(1 for connection in connections if connection.is_idle()),
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive_connections": MAX_KEEPALIVE_CONNECTIONS,
+        "per_host_limit": PER_HOST_LIMIT
+    }
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,227 @@
+import re
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import catalog
+from destination_index import normalize
+from classes.OfferLoader import BOARD_TYPES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",), ("june", "jun"),
+        ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"), ("october", "oct"),
+        ("november", "nov"), ("december", "dec")
+    ], start=1)
+    for name in names
+}
+
+# Month names that are also ordinary words ("I may want..."), only taken as a month right after "in"
+AMBIGUOUS_MONTHS = {"may", "mar"}
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+
+# Unit words following a number, and the search field they fill
+UNITS = {
+    "star": "stars", "stars": "stars",
+    "night": "nights", "nights": "nights",
+    "adult": "adults", "adults": "adults", "person": "adults", "persons": "adults", "people": "adults",
+    "child": "children", "children": "children", "kid": "children", "kids": "children",
+    "euro": "price", "euros": "price", "eur": "price"
+}
+PRICE_WORDS = {"under", "below", "max", "maximum", "budget", "upto"}
+
+# A catalog name right after these is more likely an ordinary word
+ARTICLES = {"a", "an"}
+
+# Catalog names (and aliases) that are also ordinary words ("nice hotels", "budget hotels"), only taken
+# as a name when capitalised and not the first word of the message
+AMBIGUOUS_NAMES = {"nice", "budget", "beach", "romantic", "discovery", "up to 400"}
+
+# Words that carry no search criteria
+FILLER = {
+    "a", "an", "the", "in", "to", "at", "for", "with", "and", "of", "on", "from", "per", "pp", "up",
+    "i", "we", "want", "would", "like", "looking", "search", "find", "show", "me", "please",
+    "trip", "trips", "holiday", "holidays", "vacation", "vacations", "hotel", "hotels", "offers", "total"
+}
+
+# Longest catalog name tried, in words
+MAX_PHRASE_WORDS = 5
+
+_WORDS = re.compile(r"\S+")
+
+
+def _number(word: str) -> Optional[int]:
+    if word.isdigit():
+        return int(word)
+    return NUMBER_WORDS.get(word)
+
+
+class IntentParser:
+    """
+    Recognizes messages that are nothing but search criteria ("Paris, 4 stars, July,
+    2 adults, 7 nights") and turns them into makeSearch arguments without the assistant.
+
+    Every word has to be a catalog name (destination, group, theme, facility, board
+    type), a month, a number with a unit, a price limit or a filler word, and at least
+    one destination, group or theme must be named. Anything else returns None and the
+    message goes to the assistant as usual.
+    """
+
+    def __init__(self):
+        self._catalog: Optional[catalog.Catalog] = None
+        self._facilities: Dict[str, str] = {}
+        self._boards = {normalize(board): board for board in BOARD_TYPES}
+
+        self._stats = {
+            "messages": 0,
+            "hits": 0,
+            "parse_seconds": 0.0
+        }
+
+    def _phrase(self, current: catalog.Catalog, phrase: str) -> Optional[tuple]:
+        # Board types first, "all inclusive" is a board before it is a theme alias
+        if phrase in self._boards:
+            return "room_board_type", self._boards[phrase]
+        for field, index in (("destination_names", current.destinations), ("destination_group_names", current.groups),
+                             ("destination_theme_names", current.themes)):
+            match = index.lookup(phrase)
+            if match is not None:
+                return field, match.name.strip() if field == "destination_names" else match.name
+        if phrase in self._facilities:
+            return "hotel_facilities", self._facilities[phrase]
+        return None
+
+    def parse(self, text: str) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        self._stats["messages"] += 1
+        try:
+            search = self._parse(text)
+        finally:
+            self._stats["parse_seconds"] += time.perf_counter() - started
+        if search is not None:
+            self._stats["hits"] += 1
+            logger.info(f"Parsed message locally: {search}")
+        return search
+
+    def _parse(self, text: str) -> Optional[Dict[str, Any]]:
+        current = catalog.current()
+        if current is not self._catalog:
+            self._catalog = current
+            self._facilities = {normalize(name): name for name in current.facility_ids}
+
+        # Normalized words, and whether the word they come from is capitalised in the message
+        words: List[str] = []
+        capitalised: List[bool] = []
+        for token in _WORDS.findall(text):
+            initial = next((char for char in token if char.isalnum()), "")
+            for word in normalize(token).split():
+                words.append(word)
+                capitalised.append(initial.isupper())
+        lists: Dict[str, List[Any]] = {}
+        capacity: Dict[str, int] = {}
+        max_price: Optional[int] = None
+
+        i = 0
+        while i < len(words):
+            word = words[i]
+            number = _number(word)
+            following = words[i + 1] if i + 1 < len(words) else None
+
+            if number is not None and following in UNITS:
+                unit = UNITS[following]
+                if unit == "stars" and 1 <= number <= 5:
+                    lists.setdefault("stars", []).append(number)
+                elif unit == "nights" and 1 <= number <= 30:
+                    lists.setdefault("number_of_nights", []).append(number)
+                elif unit == "adults" and 1 <= number <= 10:
+                    capacity["number_of_adults"] = number
+                elif unit == "children" and 0 <= number <= 10:
+                    capacity["number_of_children"] = number
+                elif unit == "price":
+                    max_price = number
+                else:
+                    return None
+                i += 2
+                continue
+
+            price_limit = word in PRICE_WORDS or (word == "to" and i > 0 and words[i - 1] == "up")
+            if price_limit and following is not None and following.isdigit():
+                max_price = int(following)
+                i += 2
+                if i < len(words) and UNITS.get(words[i]) == "price":
+                    i += 1
+                continue
+
+            matched = None
+            for length in range(min(MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+                phrase = " ".join(words[i:i + length])
+                if phrase in AMBIGUOUS_NAMES and (i == 0 or not capitalised[i]):
+                    continue
+                matched = self._phrase(current, phrase)
+                if matched is not None:
+                    break
+            if matched is not None:
+                field, name = matched
+                # "a nice hotel" is not a trip to Nice
+                if i > 0 and words[i - 1] in ARTICLES:
+                    return None
+                if name not in lists.setdefault(field, []):
+                    lists[field].append(name)
+                i += length
+                continue
+
+            if word in MONTHS and (word not in AMBIGUOUS_MONTHS or (i > 0 and words[i - 1] == "in")):
+                lists.setdefault("travelMonth", []).append(MONTHS[word])
+            elif word not in FILLER:
+                return None
+            i += 1
+
+        if not any(field in lists for field in ("destination_names", "destination_group_names", "destination_theme_names")):
+            return None
+
+        search: Dict[str, Any] = dict(lists)
+        if capacity:
+            search["adults_children_capacity"] = capacity
+        if max_price is not None:
+            search["max_price_per_person"] = max_price
+        return search
+
+    def stats(self) -> Dict[str, Any]:
+        messages = self._stats["messages"]
+        return {
+            "messages": messages,
+            "hits": self._stats["hits"],
+            "hit_ratio": (self._stats["hits"] / messages) if messages else 0.0,
+            "parse_ms_avg": (self._stats["parse_seconds"] / messages * 1000) if messages else 0.0
+        }
+
+
+def format_reply(output: Dict[str, Any]) -> str:
+    """
+    User-facing text for a compact makeSearch output (see ToolOutput.compact)
+    """
+    if output.get("status") == "error":
+        return f"Sorry, I couldn't complete the search: {output.get('message')}"
+
+    lines = []
+    if "offers_found" in output:
+        lines.append(f"I found {output['offers_found']} matching offers.")
+    for offer in output.get("offers", []):
+        details = ", ".join(str(part) for part in (
+            f"{offer['rating']} stars" if "rating" in offer else None,
+            offer.get("board"),
+            f"{offer['nights']} nights" if "nights" in offer else None,
+            f"from {offer['departure_date']}" if "departure_date" in offer else None
+        ) if part)
+        price = f": {offer['price_per_person']} EUR per person" if "price_per_person" in offer else ""
+        lines.append(f"- {offer.get('hotel', 'Hotel')}{f' ({details})' if details else ''}{price}")
+    if output.get("unavailable"):
+        lines.append("Some results are missing because a search service didn't respond.")
+    if output.get("message"):
+        lines.append(output["message"])
+    return "\n".join(lines)
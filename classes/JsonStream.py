@@ -0,0 +1,150 @@
+import json
+import codecs
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayStream:
+    """
+    Incrementally decodes a JSON document and yields the items of one array in it.
+
+    The array is either the document itself or the value of the first top-level key
+    in `keys`. Items are yielded as soon as they are fully received, so memory stays
+    bounded by one chunk plus one item regardless of the document size. Other
+    top-level fields (e.g. "total") are collected in `meta` once they have been read.
+    """
+
+    def __init__(self, keys: Iterable[str] = ("offers", "results", "data")):
+        self.keys = tuple(keys)
+        self.meta: Dict[str, Any] = {}
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._array_done = False
+
+    async def items(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in chunks:
+            self._feed(utf8.decode(chunk))
+            for item in self._drain():
+                yield item
+        self._feed(utf8.decode(b"", final=True))
+        for item in self._drain(final=True):
+            yield item
+        # A cut-off response would otherwise look like a short last page
+        if self._state != "done":
+            raise ValueError("JSON document ended before it was complete")
+
+    def _feed(self, text: str):
+        # Drop what has been consumed before appending, keeping the buffer small
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += text
+
+    def _skip_whitespace(self) -> Optional[str]:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else None
+
+    def _decode_value(self, final: bool):
+        """
+        Decode the value at the current position, or return (False, None) if more input is needed
+        """
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return False, None
+        # A number cut by a chunk boundary ("12" of "12.5e3") decodes cleanly, so only trust
+        # a scalar once the character after it shows where it ends
+        if not final and self._buffer[self._pos] not in "{[\"":
+            if end == len(self._buffer) or self._buffer[end] not in _WHITESPACE + ",]}":
+                return False, None
+        self._pos = end
+        return True, value
+
+    def _drain(self, final: bool = False):
+        while True:
+            char = self._skip_whitespace()
+            if char is None:
+                return
+
+            if self._state == "start":
+                self._pos += 1
+                if char == "[":
+                    self._state = "array_first"
+                elif char == "{":
+                    self._state = "object_key_first"
+                else:
+                    raise ValueError("Expected a JSON object or array")
+
+            elif self._state in ("object_key_first", "object_key"):
+                if char == "}" and self._state == "object_key_first":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                done, key = self._decode_value(final)
+                if not done:
+                    return
+                self._key = key
+                self._state = "object_colon"
+
+            elif self._state == "object_colon":
+                if char != ":":
+                    raise ValueError("Expected ':' after object key")
+                self._pos += 1
+                self._state = "object_value"
+
+            elif self._state == "object_value":
+                if char == "[" and self._key in self.keys and not self._array_done:
+                    self._pos += 1
+                    self._state = "array_first"
+                    continue
+                done, value = self._decode_value(final)
+                if not done:
+                    return
+                self.meta[self._key] = value
+                self._state = "object_next"
+
+            elif self._state == "object_next":
+                self._pos += 1
+                if char == ",":
+                    self._state = "object_key"
+                elif char == "}":
+                    self._state = "done"
+                else:
+                    raise ValueError("Expected ',' or '}' in object")
+
+            elif self._state in ("array_first", "array_item"):
+                if char == "]" and self._state == "array_first":
+                    self._pos += 1
+                    self._end_array()
+                    continue
+                done, item = self._decode_value(final)
+                if not done:
+                    return
+                self._state = "array_next"
+                yield item
+
+            elif self._state == "array_next":
+                self._pos += 1
+                if char == ",":
+                    self._state = "array_item"
+                elif char == "]":
+                    self._end_array()
+                else:
+                    raise ValueError("Expected ',' or ']' in array")
+
+            else:
+                # Trailing content after the document is ignored
+                self._pos = len(self._buffer)
+                return
+
+    def _end_array(self):
+        self._array_done = True
+        self._state = "object_next" if self._key is not None else "done"
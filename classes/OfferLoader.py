@@ -1,80 +1,249 @@
 import json
-import requests
-from typing import List, Optional
+import os
+import asyncio
+import httpx
+import classes.HttpClient as HttpClient
+import classes.SearchCache as SearchCache
+import classes.JsonStream as JsonStream
+import catalog
+from typing import Any, AsyncIterator, Dict, List, Optional
 from datetime import datetime
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_offers() -> Optional[dict]:
+BASE_URL = "https://www.holidayheroes.de/api_no_auth/holiday_finder/offers/"
 
-    BASE_URL = "https://www.holidayheroes.de/api_no_auth/holiday_finder/offers/"
+# Offers requested per page when walking results
+PAGE_SIZE = 100
 
-    try:
-        # Construct request payload
-        payload = {
-            "locale": "de",
-            "currency": "EUR",
-            "fromwhere": ['BER'],
-            "engine": {
-                "market": 1,
-                "where": [162],  # Default location ID
-                "when": {
-                    "months": {
-                        "periods": [],
-                        "min": None,
-                        "max": None,
-                        "nights": []
-                    }
-                },
-                "who": {
-                    "adult": 2,
-                    "child": 0,
-                    "room": 1,
-                    "childAges": []
-                },
-                "what": [],
-                "whereTxt": ["Paris"],
-                "whatTxt": [],
-                "destinationGroups": []
+# Decode offers from the response stream one by one instead of parsing whole pages
+INCREMENTAL_PARSING = os.getenv("OFFERS_INCREMENTAL_PARSING", "").lower() in ("1", "true", "yes")
+
+# Defaults used when the search doesn't say otherwise
+DEFAULT_DEPARTURE_AIRPORTS = ['BER']
+DEFAULT_ADULTS = 2
+
+# room_board_type values from the makeSearch schema to the API's board codes
+BOARD_TYPES = {
+    "room only": "RO",
+    "with breakfast": "BB",
+    "breakfast and dinner": "HB",
+    "breakfast lunch and dinner": "FB",
+    "all inclusive": "AI"
+}
+
+def build_payload(search_data: Optional[Dict[str, Any]] = None, current_catalog: Optional[catalog.Catalog] = None) -> Dict[str, Any]:
+    """
+    Build the offers request from mapped search data (see make_search), so the API
+    only returns matching offers. Without search data the default Paris search is used.
+    Theme and group IDs come from `current_catalog`, the version the search was mapped
+    with (default: the current one).
+    """
+    current_catalog = current_catalog or catalog.current()
+    if search_data is None:
+        search_data = {"destinationIds": [162], "destination_names": ["Paris"]}
+
+    capacity = search_data.get("adults_children_capacity") or {}
+    children_ages = capacity.get("children_ages", [])
+    dates = search_data.get("vacation_specific_dates") or search_data.get("vacation_date_range") or {}
+    if not isinstance(dates, dict):
+        dates = {}
+
+    # Construct request payload
+    return {
+        "locale": "de",
+        "currency": "EUR",
+        "fromwhere": search_data.get("departure_airports") or DEFAULT_DEPARTURE_AIRPORTS,
+        "engine": {
+            "market": 1,
+            "where": search_data.get("destinationIds", []),
+            "when": {
+                "months": {
+                    "periods": _month_periods(search_data.get("travelMonth", [])),
+                    "min": dates.get("start_date"),
+                    "max": dates.get("end_date"),
+                    "nights": search_data.get("number_of_nights", [])
+                }
             },
-            "filters": {
-                "rating": [],
-                "stops": [],
-                "refundable": False,
-                "board": [],
-                "amenities": [],
-                "amenitiesTxt": [],
-                "luggage": {
-                    "canAddTrolley": False,
-                    "canAddCib": False
-                },
-                "flex": False
+            "who": {
+                "adult": capacity.get("number_of_adults", DEFAULT_ADULTS),
+                "child": capacity.get("number_of_children", len(children_ages)),
+                "room": 1,
+                "childAges": children_ages
             },
-            "sort": {"best": -1},
-            "limit": 100,
-            "offset": 0,
-            "searchUserProfile": 0
-        }
-
-        results = {}
-
-        timestamp = int(datetime.now().timestamp() * 1000)
-        params = {
-                "data": json.dumps(payload),
-                "muid": "77cb4fd097a64e27fa65d827fcc76b34",
-                "t": timestamp
-            }
-        
+            "what": _ids(current_catalog.theme_ids, search_data.get("destination_theme_names", [])),
+            "whereTxt": search_data.get("destination_names", []),
+            "whatTxt": search_data.get("destination_theme_names", []),
+            "destinationGroups": _ids(current_catalog.group_ids, search_data.get("destination_group_names", []))
+        },
+        "filters": {
+            "rating": search_data.get("rating") or search_data.get("stars", []),
+            "stops": [],
+            "refundable": False,
+            "board": [BOARD_TYPES[board] for board in search_data.get("room_board_type", []) if board in BOARD_TYPES],
+            "amenities": search_data.get("amenities", []),
+            "amenitiesTxt": search_data.get("hotel_facilities", []),
+            "luggage": {
+                "canAddTrolley": False,
+                "canAddCib": False
+            },
+            "flex": False
+        },
+        "sort": {"best": -1},
+        "limit": PAGE_SIZE,
+        "offset": 0,
+        "searchUserProfile": 0
+    }
+
+def _month_periods(months: List[Any]) -> List[str]:
+    # Months are given without a year, take the next time each one comes around.
+    # The schema types them as numbers, so 7.0 is July; anything outside 1-12 is dropped.
+    today = datetime.now()
+    valid = set()
+    for month in months:
+        try:
+            number = int(month)
+        except (TypeError, ValueError):
+            continue
+        if number == month and 1 <= number <= 12:
+            valid.add(number)
+    periods = []
+    for month in sorted(valid):
+        year = today.year if month >= today.month else today.year + 1
+        periods.append(f"{year}-{month:02d}")
+    return periods
+
+def _ids(catalog_ids: Dict[str, int], names: List[str]) -> List[int]:
+    ids = [catalog_ids.get(name) for name in names]
+    return [catalog_id for catalog_id in ids if isinstance(catalog_id, int)]
+
+
+async def load_offers(search_data: Optional[Dict[str, Any]] = None, max_offers: int = PAGE_SIZE,
+                      current_catalog: Optional[catalog.Catalog] = None) -> Optional[dict]:
+    """
+    Load up to `max_offers` offers matching the search, or None if the offers could not be fetched
+    """
+    try:
+        payload = build_payload(search_data, current_catalog)
+        offers = [offer async for offer in iter_offers(payload, max_offers=max_offers)]
+    except Exception as e:
+        logger.error(f"Error loading offers: {str(e)}")
+        return None
+    return {"offers": offers}
+
+async def iter_offers(payload: Optional[Dict[str, Any]] = None, page_size: int = PAGE_SIZE,
+                      max_offers: Optional[int] = None, prefetch: bool = True,
+                      incremental: Optional[bool] = None) -> AsyncIterator[dict]:
+    """
+    Yield offers page by page as each page arrives.
+
+    Stops after `max_offers` offers, on a short page, or once the reported total
+    is reached. With `prefetch` the next page is requested in the background while
+    the caller consumes the current one. Breaking out of the loop cancels any
+    pending prefetch.
+
+    With `incremental` (default: OFFERS_INCREMENTAL_PARSING) each page is decoded
+    from the response stream and offers are yielded as they are parsed, so memory
+    doesn't grow with the page size. Incremental pages bypass the search cache.
+    """
+    payload = payload if payload is not None else build_payload()
+    if incremental if incremental is not None else INCREMENTAL_PARSING:
+        async for offer in _iter_streamed_offers(payload, page_size, max_offers):
+            yield offer
+        return
+
+    yielded = 0
+    offset = payload.get("offset", 0)
+    next_page = asyncio.ensure_future(_load_page(payload, offset, page_size))
+
+    try:
+        while next_page is not None:
+            page = await next_page
+            next_page = None
+            if page is None:
+                raise Exception(f"Failed to load offers page at offset {offset}")
+
+            offers = _page_offers(page)
+            total = page.get("total") if isinstance(page, dict) else None
+            offset += page_size
+            has_more = len(offers) >= page_size and (total is None or offset < total)
+            if max_offers is not None and yielded + len(offers) >= max_offers:
+                has_more = False
+
+            if has_more and prefetch:
+                next_page = asyncio.ensure_future(_load_page(payload, offset, page_size))
+
+            for offer in offers:
+                if max_offers is not None and yielded >= max_offers:
+                    return
+                yielded += 1
+                yield offer
+
+            if has_more and next_page is None:
+                next_page = asyncio.ensure_future(_load_page(payload, offset, page_size))
+    finally:
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
+
+async def _load_page(payload: Dict[str, Any], offset: int, limit: int) -> Optional[Any]:
+    page_payload = {**payload, "offset": offset, "limit": limit}
+    return await SearchCache.cached("offers", page_payload, lambda: _fetch_offers(page_payload))
+
+async def _iter_streamed_offers(payload: Dict[str, Any], page_size: int, max_offers: Optional[int]) -> AsyncIterator[dict]:
+    yielded = 0
+    offset = payload.get("offset", 0)
+
+    while True:
+        page_payload = {**payload, "offset": offset, "limit": page_size}
+        parser = JsonStream.JsonArrayStream()
+        count = 0
+
+        logger.info(f"Streaming offers page from: {BASE_URL} at offset {offset}")
+        async with HttpClient.stream(BASE_URL, params=_request_params(page_payload)) as response:
+            response.raise_for_status()
+            async for offer in parser.items(response.aiter_bytes()):
+                if max_offers is not None and yielded >= max_offers:
+                    return
+                count += 1
+                yielded += 1
+                yield offer
+
+        offset += page_size
+        total = parser.meta.get("total")
+        if count < page_size or (total is not None and offset >= total):
+            return
+
+def _page_offers(page: Any) -> List[dict]:
+    # The endpoint answers with either a bare list or an object wrapping the list
+    if isinstance(page, list):
+        return page
+    if isinstance(page, dict):
+        for key in ("offers", "results", "data"):
+            if isinstance(page.get(key), list):
+                return page[key]
+    return []
+
+def _request_params(payload: dict) -> Dict[str, Any]:
+    timestamp = int(datetime.now().timestamp() * 1000)
+    return {
+        "data": json.dumps(payload),
+        "muid": "77cb4fd097a64e27fa65d827fcc76b34",
+        "t": timestamp
+    }
+
+async def _fetch_offers(payload: dict) -> Optional[Any]:
+    try:
+        params = _request_params(payload)
+
         logger.info(f"Making API request to: {BASE_URL} with params: {params}")
-        response = requests.get(BASE_URL, params=params)
+        response = await HttpClient.get(BASE_URL, params=params)
         response.raise_for_status()
-        #logger.info(f"Response: {response.json()}")
-        
-        return results
+
+        return response.json()
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error loading offers: {str(e)}")
         return None
     except json.JSONDecodeError as e:
@@ -0,0 +1,189 @@
+import math
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+import classes.OfferLoader as OfferLoader
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Keys an offer may use for each column, first match wins
+FIELD_NAMES = {
+    "price": ("pricePerPerson", "price_per_person", "price"),
+    "rating": ("rating", "stars"),
+    "board": ("board", "boardType"),
+    "nights": ("nights", "numberOfNights"),
+    "date": ("departureDate", "date", "startDate"),
+    "destination_id": ("destinationId", "destination_id")
+}
+
+# Board codes stored as small integers, index 0 means unknown
+BOARD_CODES = ["", "RO", "BB", "HB", "FB", "AI"]
+_BOARD_INDEX = {code: index for index, code in enumerate(BOARD_CODES)}
+
+def _field(offer: Dict[str, Any], column: str) -> Any:
+    for name in FIELD_NAMES[column]:
+        if offer.get(name) is not None:
+            return offer[name]
+    return None
+
+
+def _to_dates(values: List[Any]) -> np.ndarray:
+    # ISO date strings convert in bulk, fall back to one by one if any of them is malformed
+    values = [str(value)[:10] if value else "NaT" for value in values]
+    try:
+        return np.array(values, dtype="datetime64[D]")
+    except ValueError:
+        dates = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[D]")
+        for row, value in enumerate(values):
+            try:
+                dates[row] = np.datetime64(value, "D")
+            except ValueError:
+                pass
+        return dates
+
+
+class OfferTable:
+    """
+    Column store for offers: one typed NumPy array per field, so filters run as
+    vectorized comparisons and ranking doesn't touch the original dicts.
+
+    Missing prices are NaN, missing ratings/nights/destinations 0 and missing dates NaT,
+    so they never match a filter on that column. `offers` keeps the source records
+    for the rows that survive filtering.
+    """
+
+    def __init__(self, price: np.ndarray, rating: np.ndarray, board: np.ndarray, nights: np.ndarray,
+                 date: np.ndarray, destination_id: np.ndarray, offers: Sequence[Dict[str, Any]]):
+        self.price = price
+        self.rating = rating
+        self.board = board
+        self.nights = nights
+        self.date = date
+        self.destination_id = destination_id
+        self.offers = offers
+
+    @classmethod
+    def from_offers(cls, offers: Iterable[Dict[str, Any]]) -> "OfferTable":
+        offers = list(offers)
+
+        # Columns are collected as plain lists and converted once, per-element numpy writes are slow
+        prices = [_field(offer, "price") for offer in offers]
+        price = np.array([np.nan if value is None else value for value in prices], dtype=np.float32)
+        rating = np.array([_field(offer, "rating") or 0 for offer in offers], dtype=np.float32)
+        board = np.array([_BOARD_INDEX.get(_field(offer, "board"), 0) for offer in offers], dtype=np.int8)
+        nights = np.array([_field(offer, "nights") or 0 for offer in offers], dtype=np.int16)
+        dates = _to_dates([_field(offer, "date") for offer in offers])
+        destination_id = np.array([_field(offer, "destination_id") or 0 for offer in offers], dtype=np.int32)
+
+        return cls(price, rating, board, nights, dates, destination_id, offers)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def mask(self, max_price: Optional[float] = None, stars: Optional[Sequence[int]] = None,
+             boards: Optional[Sequence[str]] = None, nights: Optional[Sequence[int]] = None,
+             date_from: Optional[str] = None, date_to: Optional[str] = None,
+             destination_ids: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Boolean row mask for the given criteria, None or empty criteria are ignored
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if max_price is not None:
+            selected &= self.price <= max_price
+        if stars:
+            selected &= np.isin(self.rating, np.asarray(stars, dtype=np.float32))
+        if boards:
+            codes = [_BOARD_INDEX[board] for board in boards if board in _BOARD_INDEX]
+            selected &= np.isin(self.board, np.asarray(codes, dtype=np.int8))
+        if nights:
+            selected &= np.isin(self.nights, np.asarray(nights, dtype=np.float32))
+        if date_from:
+            selected &= self.date >= np.datetime64(date_from, "D")
+        if date_to:
+            selected &= self.date <= np.datetime64(date_to, "D")
+        if destination_ids:
+            selected &= np.isin(self.destination_id, np.asarray(destination_ids, dtype=np.int32))
+        return selected
+
+    def filter(self, **criteria) -> "OfferTable":
+        return self.take(np.flatnonzero(self.mask(**criteria)))
+
+    def take(self, rows: np.ndarray) -> "OfferTable":
+        return OfferTable(
+            self.price[rows], self.rating[rows], self.board[rows], self.nights[rows],
+            self.date[rows], self.destination_id[rows], [self.offers[row] for row in rows]
+        )
+
+    def top_k(self, k: int, by: str = "price", descending: bool = False) -> np.ndarray:
+        """
+        Row indices of the k best rows ordered by `by`. Rows missing that value come last.
+        Selection is a partial sort (O(n) argpartition), only the k winners are fully sorted.
+        """
+        values = getattr(self, by).astype(np.float64)
+        values = np.where(np.isnan(values), np.inf, -values if descending else values)
+        if k >= len(values):
+            return np.argsort(values, kind="stable")
+        candidates = np.argpartition(values, k)[:k]
+        return candidates[np.argsort(values[candidates], kind="stable")]
+
+    def records(self, rows: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        if rows is None:
+            return list(self.offers)
+        return [self.offers[row] for row in rows]
+
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in (self.price, self.rating, self.board, self.nights, self.date, self.destination_id))
+
+
+def _date(value: Any) -> Optional[str]:
+    # Model output isn't always a YYYY-MM-DD date ("next July"), such a bound is not applied
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        logger.warning(f"Ignoring date filter {value!r}, expected YYYY-MM-DD")
+        return None
+
+
+def _number(value: Any) -> Optional[float]:
+    # Numbers may arrive as strings ("500"), anything that isn't a number is not applied
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring filter value {value!r}, expected a number")
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _numbers(values: Any) -> Optional[List[float]]:
+    if values is None:
+        return None
+    if not isinstance(values, list):
+        values = [values]
+    numbers = [number for number in map(_number, values) if number is not None]
+    return numbers or None
+
+
+def criteria_from_search(search_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translate mapped search data (see make_search) into OfferTable.mask criteria.
+    Destinations are left out, the offers request already filters on them.
+    """
+    dates = search_data.get("vacation_specific_dates") or search_data.get("vacation_date_range") or {}
+    if not isinstance(dates, dict):
+        dates = {}
+    return {
+        "max_price": _number(search_data.get("max_price_per_person")),
+        "stars": _numbers(search_data.get("rating") or search_data.get("stars")),
+        "boards": [OfferLoader.BOARD_TYPES[board] for board in search_data.get("room_board_type", []) if board in OfferLoader.BOARD_TYPES],
+        "nights": _numbers(search_data.get("number_of_nights")),
+        "date_from": _date(dates.get("start_date")),
+        "date_to": _date(dates.get("end_date"))
+    }
@@ -0,0 +1,52 @@
+import logging
+from typing import Any, Dict, Optional
+
+import classes.SearchCache as SearchCache
+from destination_index import normalize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Cached replies to the first message of a conversation.
+
+    Keys are the normalized message plus a version string (catalog and assistant
+    definition), so a new catalog or prompt never serves stale answers. Entries live
+    in a SearchCache and share its TTL and LRU eviction.
+
+    A conversation answered from the cache has no thread yet, the caller keeps the
+    exchange as the conversation's seed (see ConversationStore) so the thread starts
+    with it if the user continues.
+    """
+
+    def __init__(self, cache: SearchCache.SearchCache):
+        self.cache = cache
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0
+        }
+
+    @staticmethod
+    def _key(message: str, version: str) -> str:
+        return SearchCache.cache_key("first_turn", {"message": normalize(message), "version": version})
+
+    async def get(self, message: str, version: str) -> Optional[str]:
+        found, reply = await self.cache.get(self._key(message, version))
+        self._stats["hits" if found else "misses"] += 1
+        return reply if found else None
+
+    async def put(self, message: str, version: str, reply: str):
+        self._stats["stores"] += 1
+        await self.cache.set(self._key(message, version), reply)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": (self._stats["hits"] / lookups) if lookups else 0.0,
+            "cache": self.cache.stats()
+        }
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import openai
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Statuses in which a run is still being worked on by OpenAI
+PENDING_STATUSES = ("queued", "in_progress", "cancelling")
+
+
+class _TrackedRun:
+    __slots__ = ("thread_id", "run_id", "future", "on_poll", "interval", "next_poll_at", "polls")
+
+    def __init__(self, thread_id: str, run_id: str, future: asyncio.Future, first_interval: float, on_poll: Optional[Callable[[], None]] = None):
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.future = future
+        self.on_poll = on_poll
+        self.interval = first_interval
+        self.next_poll_at = time.monotonic() + first_interval
+        self.polls = 0
+
+
+class RunPoller:
+    """
+    Single background scheduler that polls every in-flight run for all conversations.
+
+    Callers await `wait(thread_id, run_id)`, which resolves with the run as soon as
+    it leaves the queued/in_progress state (completed, failed, requires_action, ...).
+    Each run is first polled after `min_interval` seconds and then backs off by
+    `backoff` up to `max_interval`. A 429 from the API pauses all polling for the
+    duration given in its retry-after headers.
+    """
+
+    def __init__(self, client, min_interval: float = 0.25, max_interval: float = 2.0, backoff: float = 1.5):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self._runs: Dict[Tuple[str, str], _TrackedRun] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self._poll_tasks = set()
+
+        self._polls_total = 0
+        self._runs_tracked = 0
+        self._runs_finished = 0
+        self._polls_for_finished_runs = 0
+        self._max_polls_per_run = 0
+        self._rate_limited = 0
+        self._poll_errors = 0
+
+    async def wait(self, thread_id: str, run_id: str, on_poll: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Wait until the run needs attention and return its latest state.
+        `on_poll` is called before each retrieve made for this run.
+        """
+        self._ensure_started()
+
+        future = asyncio.get_running_loop().create_future()
+        self._runs[(thread_id, run_id)] = _TrackedRun(thread_id, run_id, future, self.min_interval, on_poll)
+        self._runs_tracked += 1
+        self._wakeup.set()
+
+        try:
+            return await future
+        finally:
+            self._runs.pop((thread_id, run_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight_runs": len(self._runs),
+            "runs_tracked": self._runs_tracked,
+            "runs_finished": self._runs_finished,
+            "polls_total": self._polls_total,
+            "polls_per_run": (self._polls_for_finished_runs / self._runs_finished) if self._runs_finished else 0.0,
+            "max_polls_per_run": self._max_polls_per_run,
+            "rate_limited": self._rate_limited,
+            "poll_errors": self._poll_errors
+        }
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run_scheduler())
+
+    async def _run_scheduler(self):
+        while True:
+            self._wakeup.clear()
+
+            # Forget runs whose caller went away (e.g. the WebSocket closed)
+            for key in [key for key, tracked in self._runs.items() if tracked.future.done()]:
+                self._runs.pop(key, None)
+
+            if not self._runs:
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            next_poll_at = max(min(tracked.next_poll_at for tracked in self._runs.values()), self._paused_until)
+            if next_poll_at > now:
+                timeout = None if next_poll_at == float("inf") else next_poll_at - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Polls run as their own tasks so one slow request doesn't delay the others
+            for tracked in [tracked for tracked in self._runs.values() if tracked.next_poll_at <= now]:
+                tracked.next_poll_at = float("inf")
+                task = asyncio.create_task(self._poll(tracked))
+                self._poll_tasks.add(task)
+                task.add_done_callback(self._poll_tasks.discard)
+
+    async def _poll(self, tracked: _TrackedRun):
+        try:
+            await self._poll_once(tracked)
+        finally:
+            self._wakeup.set()
+
+    async def _poll_once(self, tracked: _TrackedRun):
+        if tracked.on_poll is not None:
+            tracked.on_poll()
+        try:
+            run = await self.client.beta.threads.runs.retrieve(
+                thread_id=tracked.thread_id,
+                run_id=tracked.run_id
+            )
+        except openai.RateLimitError as e:
+            self._rate_limited += 1
+            delay = self._retry_after(e) or self.max_interval
+            logger.warning(f"Rate limited while polling runs, pausing polls for {delay:.2f}s")
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            tracked.next_poll_at = self._paused_until
+            return
+        except Exception as e:
+            self._poll_errors += 1
+            if not tracked.future.done():
+                tracked.future.set_exception(e)
+            return
+
+        self._polls_total += 1
+        tracked.polls += 1
+
+        if run.status in PENDING_STATUSES:
+            tracked.interval = min(tracked.interval * self.backoff, self.max_interval)
+            tracked.next_poll_at = time.monotonic() + tracked.interval
+            return
+
+        self._runs_finished += 1
+        self._polls_for_finished_runs += tracked.polls
+        self._max_polls_per_run = max(self._max_polls_per_run, tracked.polls)
+        if not tracked.future.done():
+            tracked.future.set_result(run)
+
+    @staticmethod
+    def _retry_after(error: openai.RateLimitError) -> Optional[float]:
+        headers = error.response.headers if error.response is not None else {}
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import threading
+import logging
+from collections import Counter
+from typing import Any, Dict, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that can be switched on in a running worker.
+
+    While a session runs, a background thread takes the stack of every other thread
+    each `interval` seconds. The result is in the folded stack format ("thread;outer;inner
+    count" per line) read by flamegraph.pl, speedscope and similar tools. Sampling only
+    reads frames, the profiled code runs unchanged. One session runs at a time and at
+    most `max_seconds` long; the result of the last session is kept until the next starts.
+    """
+
+    def __init__(self, interval: float = 0.01, max_seconds: float = 300):
+        self.interval = interval
+        self.max_seconds = max_seconds
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._samples: Counter = Counter()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float) -> bool:
+        """
+        Profile for `seconds` (capped at max_seconds), False if a session is already running
+        """
+        with self._lock:
+            if self.running:
+                return False
+            self._seconds = max(0.0, min(seconds, self.max_seconds))
+            self._samples = Counter()
+            self._stop.clear()
+            self._started_at = time.time()
+            self._finished_at = None
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Profiling for {self._seconds}s every {self.interval * 1000:.0f} ms")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + self._seconds
+        samples: Counter = Counter()
+        try:
+            while time.monotonic() < deadline and not self._stop.is_set():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(thread_id, str(thread_id)))
+                    samples[";".join(reversed(stack))] += 1
+                self._stop.wait(self.interval)
+        finally:
+            self._samples = samples
+            self._finished_at = time.time()
+            logger.info(f"Profiling finished, {sum(samples.values())} samples")
+
+    def result(self) -> Optional[str]:
+        """
+        Folded stacks of the last finished session, None if there is none
+        """
+        if self.running or self._finished_at is None:
+            return None
+        return "".join(f"{stack} {count}\n" for stack, count in self._samples.most_common())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "seconds": self._seconds,
+            "started_at": self._started_at,
+            "finished_at": self._finished_at,
+            "samples": sum(self._samples.values())
+        }
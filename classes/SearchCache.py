@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import classes.SingleFlight as SingleFlight
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def canonicalize(value: Any) -> Any:
+    """
+    Normalize search parameters so equivalent searches produce the same key:
+    dict keys are sorted, empty values dropped, strings stripped and lists of
+    scalars (destination IDs, amenities, ratings, months...) sorted and deduplicated.
+    """
+    if isinstance(value, dict):
+        normalized = {}
+        for key in sorted(value):
+            item = canonicalize(value[key])
+            if item is None or item == [] or item == {} or item == "":
+                continue
+            normalized[key] = item
+        return normalized
+    if isinstance(value, (list, tuple, set)):
+        items = [canonicalize(item) for item in value if item is not None]
+        if all(isinstance(item, (str, int, float, bool)) for item in items):
+            return sorted(set(items), key=lambda item: (type(item).__name__, item))
+        return items
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(namespace: str, params: Any) -> str:
+    payload = json.dumps(canonicalize(params), sort_keys=True, separators=(",", ":"))
+    return f"{namespace}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class SearchCache:
+    """
+    Two-tier cache for backend search results.
+
+    Tier 1 is an in-process LRU of up to `memory_entries` items, tier 2 a SQLite
+    file that survives restarts and is trimmed to `disk_max_bytes`, dropping the
+    least recently used rows first. Entries in both tiers expire after `ttl` seconds.
+    """
+
+    def __init__(self, path: Optional[str], ttl: float = 600, memory_entries: int = 1024, disk_max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0
+        }
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return True, value
+            del self._memory[key]
+            self._stats["expired"] += 1
+
+        if self.path:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None:
+                expires_at, value = row
+                self._stats["disk_hits"] += 1
+                self._remember(key, expires_at, value)
+                return True, value
+
+        self._stats["misses"] += 1
+        return False, None
+
+    async def set(self, key: str, value: Any):
+        expires_at = time.time() + self.ttl
+        self._stats["sets"] += 1
+        self._remember(key, expires_at, value)
+        if self.path:
+            await asyncio.to_thread(self._disk_set, key, expires_at, json.dumps(value))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+        return {
+            **self._stats,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes() if self.path else 0,
+            "hit_ratio": (hits / lookups) if lookups else 0.0
+        }
+
+    def _remember(self, key: str, expires_at: float, value: Any):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_last_access ON search_cache (last_access)")
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute("SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at <= time.time():
+                db.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                db.commit()
+                self._stats["expired"] += 1
+                return None
+            db.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            db.commit()
+        return expires_at, json.loads(value)
+
+    def _disk_set(self, key: str, expires_at: float, value: str):
+        with self._db_lock:
+            db = self._connection()
+            now = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), expires_at, now)
+            )
+            expired = db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,)).rowcount
+            self._stats["expired"] += max(expired, 0)
+
+            # Trim to the size budget, least recently used first
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+            if total > self.disk_max_bytes:
+                for row_key, size in db.execute("SELECT key, size FROM search_cache ORDER BY last_access").fetchall():
+                    if total <= self.disk_max_bytes:
+                        break
+                    db.execute("DELETE FROM search_cache WHERE key = ?", (row_key,))
+                    total -= size
+                    self._stats["disk_evictions"] += 1
+            db.commit()
+
+    def _disk_bytes(self) -> int:
+        with self._db_lock:
+            return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+
+
+# Shared cache used by HotelSearcher and OfferLoader, disabled with SEARCH_CACHE_ENABLED=0
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+
+search_cache = SearchCache(
+    path=os.getenv("SEARCH_CACHE_PATH", "search_cache.sqlite3") or None,
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", "600")),
+    memory_entries=int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "1024")),
+    disk_max_bytes=int(os.getenv("SEARCH_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+
+# Identical searches in flight at the same time share one outbound request
+search_flights = SingleFlight.SingleFlight()
+
+
+async def cached(namespace: str, params: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Serve `loader()` through the shared search cache. Concurrent misses for the same
+    key share one call, whose result is stored once. None results (failed loads) are not cached.
+    """
+    key = cache_key(namespace, params)
+    if SEARCH_CACHE_ENABLED:
+        found, value = await search_cache.get(key)
+        if found:
+            return value
+
+    async def load_and_store():
+        value = await loader()
+        if SEARCH_CACHE_ENABLED and value is not None:
+            await search_cache.set(key, value)
+        return value
+
+    return await search_flights.do(key, load_and_store)
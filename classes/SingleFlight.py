@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key starts `loader()` as a task, later callers for
+    that key await the same task while it is in flight, and everyone receives
+    its result (or exception). A caller being cancelled does not cancel the
+    shared task, so the remaining callers still get their answer.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._stats = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0
+        }
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self._stats["calls"] += 1
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(loader())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _, key=key: self._in_flight.pop(key, None))
+        else:
+            self._stats["coalesced"] += 1
+            logger.info(f"Joining in-flight request for {key}")
+
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "in_flight": len(self._in_flight)
+        }
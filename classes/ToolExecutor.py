@@ -0,0 +1,99 @@
+import json
+import time
+import asyncio
+import inspect
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ToolExecutor:
+    """
+    Registry of the assistant's tools, running all tool calls of a run step concurrently.
+
+    Tools are registered by function name and called with the parsed call arguments.
+    Coroutine functions run on the event loop, plain functions in a thread pool of
+    `thread_workers` threads. At most `max_concurrency` calls run at once across all
+    turns. Every call produces an output, so one failing or unknown tool doesn't keep
+    the run waiting: errors are returned to the assistant as {"status": "error", ...}.
+
+    `on_finish`, if given, is called with the tool name, its duration in seconds and
+    whether it succeeded after every call.
+    """
+
+    def __init__(self, max_concurrency: int = 16, thread_workers: int = 4,
+                 on_finish: Optional[Callable[[str, float, bool], None]] = None):
+        self.on_finish = on_finish
+        self._tools: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._thread_pool = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="tool")
+
+        self._calls: Counter = Counter()
+        self._errors: Counter = Counter()
+        self._steps = 0
+        self._max_calls_per_step = 0
+
+    def register(self, name: str, function: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        """
+        Register `function` as tool `name`, usable as a decorator
+        """
+        def decorator(function: Callable[[Dict[str, Any]], Any]):
+            self._tools[name] = function
+            return function
+        return decorator(function) if function is not None else decorator
+
+    async def run(self, tool_call) -> str:
+        name = tool_call.function.name
+        started = time.monotonic()
+        self._calls[name] += 1
+        succeeded = False
+        try:
+            function = self._tools.get(name)
+            if function is None:
+                raise ValueError(f"Unknown tool: {name}")
+            arguments = json.loads(tool_call.function.arguments or "{}")
+
+            async with self._semaphore:
+                if inspect.iscoroutinefunction(function):
+                    output = await function(arguments)
+                else:
+                    output = await asyncio.get_running_loop().run_in_executor(self._thread_pool, function, arguments)
+            succeeded = True
+        except Exception as e:
+            self._errors[name] += 1
+            logger.error(f"Tool {name} failed: {str(e)}", exc_info=True)
+            output = {"status": "error", "message": str(e)}
+
+        duration = time.monotonic() - started
+        logger.info(f"Tool {name} finished in {duration * 1000:.0f} ms")
+        if self.on_finish is not None:
+            self.on_finish(name, duration, succeeded)
+        return output if isinstance(output, str) else json.dumps(output)
+
+    async def run_all(self, tool_calls: List[Any]) -> List[Dict[str, str]]:
+        """
+        Run the tool calls of one step concurrently, returning tool_outputs for a single submission
+        """
+        self._steps += 1
+        self._max_calls_per_step = max(self._max_calls_per_step, len(tool_calls))
+        outputs = await asyncio.gather(*(self.run(tool_call) for tool_call in tool_calls))
+        return [
+            {"tool_call_id": tool_call.id, "output": output}
+            for tool_call, output in zip(tool_calls, outputs)
+        ]
+
+    def close(self):
+        self._thread_pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tools": sorted(self._tools),
+            "steps": self._steps,
+            "max_calls_per_step": self._max_calls_per_step,
+            "calls": dict(self._calls),
+            "errors": dict(self._errors)
+        }
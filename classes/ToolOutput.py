@@ -0,0 +1,95 @@
+import os
+import json
+import uuid
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import classes.SearchCache as SearchCache
+import classes.OfferTable as OfferTable
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Offers shown to the assistant, and the rough size it may spend on a tool output
+TOP_K = int(os.getenv("TOOL_OUTPUT_TOP_K", "5"))
+MAX_TOKENS = int(os.getenv("TOOL_OUTPUT_MAX_TOKENS", "400"))
+
+# Offer fields the assistant gets, under the names it sees, with the keys an offer may use for each
+OFFER_FIELDS = {
+    "hotel": ("hotelName", "hotel_name", "name"),
+    "destination": ("destinationName", "destination"),
+    "price_per_person": OfferTable.FIELD_NAMES["price"],
+    "rating": OfferTable.FIELD_NAMES["rating"],
+    "board": OfferTable.FIELD_NAMES["board"],
+    "nights": OfferTable.FIELD_NAMES["nights"],
+    "departure_date": OfferTable.FIELD_NAMES["date"],
+    "url": ("url", "link", "deeplink")
+}
+
+# Keys of a search result that are passed on as they are
+RESULT_FIELDS = ("status", "message", "offers_found", "unavailable", "name_resolution")
+
+# Full results, fetched by the client from /results/{result_id}. Shared by workers through the SQLite file.
+results = SearchCache.SearchCache(
+    path=os.getenv("SEARCH_RESULTS_PATH", "search_results.sqlite3") or None,
+    ttl=float(os.getenv("SEARCH_RESULTS_TTL", "3600")),
+    memory_entries=int(os.getenv("SEARCH_RESULTS_MEMORY_ENTRIES", "256")),
+    disk_max_bytes=int(os.getenv("SEARCH_RESULTS_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # About four bytes per token for JSON, good enough for a budget
+    return (len(text.encode()) + 3) // 4
+
+
+def project_offer(offer: Dict[str, Any]) -> Dict[str, Any]:
+    projected = {}
+    for field, keys in OFFER_FIELDS.items():
+        for key in keys:
+            if offer.get(key) is not None:
+                projected[field] = offer[key]
+                break
+    return projected
+
+
+def compact(result: Dict[str, Any], result_id: Optional[str] = None, top_k: int = TOP_K, max_tokens: int = MAX_TOKENS) -> str:
+    """
+    Tool output for a search result: the summary fields and the first `top_k` offers
+    (result["offers"] is expected best first) reduced to OFFER_FIELDS. Offers are
+    dropped from the end until the output fits in `max_tokens`.
+    """
+    output = {key: result[key] for key in RESULT_FIELDS if key in result}
+    if result_id is not None:
+        output["result_id"] = result_id
+
+    offers = [project_offer(offer) for offer in result.get("offers", [])[:top_k]]
+    while True:
+        output["offers"] = offers
+        if len(offers) < len(result.get("offers", [])):
+            output["more_offers"] = len(result["offers"]) - len(offers)
+        text = json.dumps(output, ensure_ascii=False, separators=(",", ":"))
+        if not offers or estimate_tokens(text) <= max_tokens:
+            return text
+        offers = offers[:-1]
+
+
+async def store(result: Dict[str, Any]) -> str:
+    result_id = uuid.uuid4().hex
+    await results.set(f"result:{result_id}", result)
+    return result_id
+
+
+async def load(result_id: str) -> Optional[Dict[str, Any]]:
+    found, result = await results.get(f"result:{result_id}")
+    return result if found else None
+
+
+async def compact_and_store(result: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Store the full result for the client, returns its result_id and the compact form for the assistant
+    """
+    result_id = await store(result)
+    output = compact(result, result_id)
+    logger.info(f"Tool output {result_id}: {len(output)} bytes (~{estimate_tokens(output)} tokens), full result {len(json.dumps(result))} bytes")
+    return result_id, output
@@ -0,0 +1,72 @@
+import logging
+from collections import Counter
+from typing import Any, Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TurnBudgetExceeded(Exception):
+    pass
+
+
+class TurnCounter:
+    """
+    OpenAI API calls made during one turn, by call name
+    """
+
+    def __init__(self, budget: int = 0):
+        self.budget = budget
+        self.calls: Counter = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def count(self, call: str, enforce: bool = True):
+        """
+        Record a call about to be made. With a budget set, a call that would exceed
+        it raises TurnBudgetExceeded instead. Only calls that start new work are
+        enforced; polls, reading a finished run's reply and cancelling a run are
+        counted with `enforce` False and never refused.
+        """
+        if enforce and self.budget and self.total >= self.budget:
+            raise TurnBudgetExceeded(f"Turn exceeded its budget of {self.budget} API calls ({dict(self.calls)})")
+        self.calls[call] += 1
+
+
+class TurnStats:
+    """
+    Aggregates TurnCounters of finished turns
+    """
+
+    def __init__(self, budget: int = 0):
+        self.budget = budget
+        self._turns = 0
+        self._calls: Counter = Counter()
+        self._max_calls = 0
+        self._over_budget = 0
+
+    def start(self) -> TurnCounter:
+        return TurnCounter(self.budget)
+
+    def finish(self, turn: TurnCounter):
+        total = turn.total
+        self._turns += 1
+        self._calls.update(turn.calls)
+        self._max_calls = max(self._max_calls, total)
+        if self.budget and total > self.budget:
+            self._over_budget += 1
+            logger.warning(f"Turn used {total} API calls, budget is {self.budget}: {dict(turn.calls)}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self._calls.values())
+        return {
+            "turns": self._turns,
+            "api_calls": total,
+            "api_calls_per_turn": (total / self._turns) if self._turns else 0.0,
+            "max_api_calls_per_turn": self._max_calls,
+            "api_calls_by_name": dict(self._calls),
+            "budget": self.budget,
+            "turns_over_budget": self._over_budget
+        }
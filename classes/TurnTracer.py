@@ -0,0 +1,114 @@
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Trace of the turn the running task belongs to, inherited by tasks it starts
+_current: "ContextVar[Optional[Trace]]" = ContextVar("turn_trace", default=None)
+
+
+class Trace:
+    """
+    Timed steps of one turn, offsets relative to the start of the turn
+    """
+    __slots__ = ("conversation_id", "started_at", "_started", "duration", "spans", "details")
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.details: Dict[str, Any] = {}
+
+    def add(self, name: str, started: float, duration: float, **attributes: Any):
+        """
+        Add a step that began at perf_counter() value `started`
+        """
+        span = {"name": name, "offset_ms": round((started - self._started) * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+        span.update(attributes)
+        self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "conversation_id": self.conversation_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            **self.details,
+            "spans": sorted(self.spans, key=lambda span: span["offset_ms"])
+        }
+
+
+class TurnTracer:
+    """
+    Records a trace for every turn and keeps the ones slower than `threshold` seconds.
+
+    Steps are added with `record()` from anywhere inside the turn, including tasks it
+    starts, without passing the trace around. The last `max_traces` slow traces are
+    kept in a ring buffer, the oldest dropped first. A negative threshold disables it.
+    """
+
+    def __init__(self, threshold: float = 5.0, max_traces: int = 100):
+        self.threshold = threshold
+        self._traces: deque = deque(maxlen=max_traces)
+
+        self._stats = {
+            "turns": 0,
+            "slow_turns": 0
+        }
+
+    @contextmanager
+    def trace(self, conversation_id: str) -> Iterator[Optional[Trace]]:
+        if self.threshold < 0:
+            yield None
+            return
+
+        trace = Trace(conversation_id)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+            trace.duration = time.perf_counter() - trace._started
+            self._stats["turns"] += 1
+            if trace.duration >= self.threshold:
+                self._stats["slow_turns"] += 1
+                self._traces.append(trace.to_dict())
+                logger.warning(f"Slow turn for conversation {conversation_id}: {trace.duration:.2f}s, {len(trace.spans)} steps traced")
+
+    @staticmethod
+    def record(name: str, started: float, duration: float, **attributes: Any):
+        """
+        Add a step to the current turn's trace, if there is one
+        """
+        trace = _current.get()
+        if trace is not None:
+            trace.add(name, started, duration, **attributes)
+
+    @staticmethod
+    def annotate(**details: Any):
+        """
+        Attach turn-level details (API calls, path taken, ...) to the current trace
+        """
+        trace = _current.get()
+        if trace is not None:
+            trace.details.update(details)
+
+    def traces(self) -> List[Dict[str, Any]]:
+        """
+        Kept slow traces, newest first
+        """
+        return list(reversed(self._traces))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "threshold": self.threshold,
+            "kept_traces": len(self._traces),
+            "max_traces": self._traces.maxlen
+        }
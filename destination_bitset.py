@@ -0,0 +1,25 @@
+from functools import lru_cache
+from typing import Iterable, Tuple
+
+# Sets of destinations are Python ints used as bitsets: bit n is set when destination ID n
+# is a member, so unions and intersections are a single | or & regardless of set size.
+
+
+def from_ids(destination_ids: Iterable[int]) -> int:
+    bits = 0
+    for destination_id in destination_ids:
+        bits |= 1 << destination_id
+    return bits
+
+
+@lru_cache(maxsize=4096)
+def to_ids(bits: int) -> Tuple[int, ...]:
+    """
+    Sorted destination IDs in a bitset, memoized so repeated queries return the same tuple
+    """
+    ids = []
+    while bits:
+        lowest = bits & -bits
+        ids.append(lowest.bit_length() - 1)
+        bits ^= lowest
+    return tuple(ids)
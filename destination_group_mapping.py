@@ -1,6 +1,4 @@
 import json
-from typing import Dict
-from mapping import map_destination
 
 destination_group_mapping = {
     "Metropolises": 33,
@@ -90,7 +88,3 @@ group_to_destinations = {
 
 def map_destination_group(destination: str) -> int:
     return destination_group_mapping.get(destination, None)
-
-def  get_group_destinations_ids(group: str) -> list[int]:
-    destinations = group_to_destinations.get(group, [])
-    return [map_destination(destination) for destination in destinations]
\ No newline at end of file
@@ -0,0 +1,172 @@
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Fuzzy matches scoring below this (Dice coefficient over trigrams) are rejected, as are matches
+# less than DEFAULT_MIN_LEAD ahead of the runner-up. A near miss is often another real place
+# ("Paros" is not Paris, "Porto Santo" is not Porto), and searching the wrong one is worse than none.
+DEFAULT_MIN_SCORE = 0.75
+DEFAULT_MIN_LEAD = 0.15
+
+# Alternative spellings and local names, mapped to the catalog name
+DESTINATION_ALIASES = {
+    "Mallorca": "Palma de Mallorca",
+    "Majorca": "Palma de Mallorca",
+    "Palma": "Palma City",
+    "Marrakech": "Marrakesh",
+    "Lisboa": "Lisbon",
+    "Lissabon": "Lisbon",
+    "Roma": "Rome",
+    "Rom": "Rome",
+    "Milano": "Milan",
+    "Mailand": "Milan",
+    "Praha": "Prague",
+    "Prag": "Prague",
+    "Wien": "Vienna",
+    "Venezia": "Venice",
+    "Venedig": "Venice",
+    "Napoli": "Naples",
+    "Neapel": "Naples",
+    "Athen": "Athens",
+    "Sevilla": "Seville",
+    "Rhodos": "Rhodes",
+    "Chania": "Chania, Crete ",
+    "Sharm": "Sharm El-Sheikh",
+    "Disneyland": "Disneyland Paris",
+    "Chalkidiki": "Halkidiki",
+    "Zante": "Zakynthos",
+    "Korsika": "Corsica",
+    "Sardinien": "Sardinia"
+}
+
+GROUP_ALIASES = {
+    "Mediterranean": "Mediterranean Sea",
+    "Emirates": "United Arab Emirates",
+    "UAE": "United Arab Emirates",
+    "Canaries": "Canary Islands",
+    "Balearics": "Balearic Islands"
+}
+
+THEME_ALIASES = {
+    "City trips": "All city trips",
+    "City breaks": "All city trips",
+    "Beach": "Beach holidays",
+    "Romantic": "Romantic break",
+    "All inclusive": "All Inclusive beach holidays",
+    "Water park": "Water park fun",
+    "Budget": "Budget friendly cities"
+}
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    """
+    Case, whitespace, punctuation and diacritic insensitive form of a name:
+    " Kraków " -> "krakow", "Chania, Crete " -> "chania crete"
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", stripped.casefold()).strip()
+
+
+def _trigrams(normalized: str) -> List[str]:
+    padded = f"  {normalized} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class Match(NamedTuple):
+    name: str
+    value: Any
+    score: float
+
+
+class NameIndex:
+    """
+    Resolves free-text names to catalog entries.
+
+    Names spelled exactly as in the catalog (or an alias) hit a plain dict before
+    any normalization, other spellings cost one normalization and a second dict
+    access. Names that still miss fall back to trigram similarity over the catalog.
+    """
+
+    def __init__(self, catalog: Dict[str, Any], aliases: Optional[Dict[str, str]] = None,
+                 min_score: float = DEFAULT_MIN_SCORE, min_lead: float = DEFAULT_MIN_LEAD):
+        self.min_score = min_score
+        self.min_lead = min_lead
+        self._raw: Dict[str, Match] = {}
+        self._exact: Dict[str, Match] = {}
+        self._names: List[str] = []
+        self._grams: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+        for name, value in catalog.items():
+            key = normalize(name)
+            self._raw[name] = self._raw[name.strip()] = Match(name, value, 1.0)
+            self._exact[key] = self._raw[name]
+
+            entry = len(self._names)
+            self._names.append(key)
+            grams = set(_trigrams(key))
+            self._grams.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(entry)
+
+        for alias, name in (aliases or {}).items():
+            # An alias spelled like a catalog name would never apply, the catalog entry wins
+            assert normalize(alias) not in self._exact, f"Alias {alias!r} is already a catalog name"
+            if name in catalog:
+                self._raw[alias] = Match(name, catalog[name], 1.0)
+                self._exact[normalize(alias)] = self._raw[alias]
+
+    def lookup(self, name: str) -> Optional[Match]:
+        """
+        Exact (normalized) lookup only
+        """
+        match = self._raw.get(name)
+        if match is not None:
+            return match
+        return self._exact.get(normalize(name))
+
+    def resolve(self, name: str) -> Optional[Match]:
+        """
+        Exact lookup, then the best fuzzy match if it scores at least `min_score`
+        and leads the next different entry by at least `min_lead`
+        """
+        if not isinstance(name, str):
+            return None
+        match = self.lookup(name)
+        if match is not None:
+            return match
+
+        candidates = self.search(name, limit=2)
+        if not candidates or candidates[0].score < self.min_score:
+            return None
+        best = candidates[0]
+        if len(candidates) > 1 and candidates[1].value != best.value and best.score - candidates[1].score < self.min_lead:
+            return None
+        return best
+
+    def search(self, name: str, limit: int = 5) -> List[Match]:
+        """
+        Catalog entries ranked by trigram similarity to `name`
+        """
+        grams = set(_trigrams(normalize(name)))
+        if not grams:
+            return []
+
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for entry in self._postings.get(gram, ()):
+                shared[entry] += 1
+
+        scored = sorted(
+            ((2 * count / (len(grams) + self._grams[entry]), entry) for entry, count in shared.items()),
+            reverse=True
+        )[:limit]
+        return [
+            Match(self._exact[self._names[entry]].name, self._exact[self._names[entry]].value, score)
+            for score, entry in scored
+        ]
+
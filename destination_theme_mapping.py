@@ -1,6 +1,4 @@
 import json
-from typing import Dict, List, Set
-from mapping import map_destination
 
 destination_theme_names = {
     "All city trips": 20,
@@ -125,32 +123,3 @@ theme_to_destinations = {
 
 def map_destination_theme(theme_name: str) -> int:
     return destination_theme_names.get(theme_name, None)
-
-
-def get_destination_ids_by_themes(themes: List[str]) -> Set[int]:
-    """
-    Returns a set of destination IDs that match all given themes.
-
-    Args:
-        themes: List of theme names to filter by
-
-    Returns:
-        Set of destination IDs that belong to all specified themes
-    """
-    if not themes:
-        return set()
-
-    # Get destinations that belong to the first theme
-    matching_destinations = set(theme_to_destinations.get(themes[0], []))
-
-    # Intersect with destinations from other themes
-    for theme in themes[1:]:
-        theme_destinations = set(theme_to_destinations.get(theme, []))
-        matching_destinations &= theme_destinations
-
-    # Convert destination names to IDs using map_destination
-    destination_ids = {map_destination(dest) for dest in matching_destinations}
-    # Remove None values if any destination wasn't found
-    destination_ids.discard(None)
-
-    return destination_ids
\ No newline at end of file
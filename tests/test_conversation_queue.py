@@ -0,0 +1,131 @@
+import asyncio
+
+from classes.ConversationQueue import ConversationQueue
+
+
+class Recorder:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.turns = []
+
+    async def __call__(self, conversation_id, messages, targets):
+        self.turns.append((conversation_id, messages, targets))
+        await asyncio.sleep(self.delay)
+
+
+async def _drain(queue: ConversationQueue):
+    while queue.stats()["active_conversations"]:
+        await asyncio.sleep(0.01)
+
+
+def test_burst_is_merged_into_one_turn():
+    async def scenario():
+        handler = Recorder()
+        queue = ConversationQueue(handler, coalesce_window=0.05)
+        for message in ("hi", "I want", "Paris"):
+            assert queue.submit("c1", message, "socket")
+        await _drain(queue)
+        return handler, queue
+
+    handler, queue = asyncio.run(scenario())
+    assert handler.turns == [("c1", ["hi", "I want", "Paris"], ["socket"])]
+    stats = queue.stats()
+    assert stats["turns"] == 1
+    assert stats["coalesced_messages"] == 2
+    assert stats["largest_batch"] == 3
+
+
+def test_conversations_are_independent():
+    async def scenario():
+        handler = Recorder()
+        queue = ConversationQueue(handler, coalesce_window=0.01)
+        queue.submit("c1", "a", "s1")
+        queue.submit("c2", "b", "s2")
+        await _drain(queue)
+        return handler
+
+    handler = asyncio.run(scenario())
+    assert sorted(handler.turns) == [("c1", ["a"], ["s1"]), ("c2", ["b"], ["s2"])]
+
+
+def test_messages_during_a_turn_go_into_the_next():
+    async def scenario():
+        handler = Recorder(delay=0.1)
+        queue = ConversationQueue(handler, coalesce_window=0.01)
+        queue.submit("c1", "first", "s1")
+        await asyncio.sleep(0.05)
+        queue.submit("c1", "second", "s1")
+        queue.submit("c1", "third", "s2")
+        await _drain(queue)
+        return handler
+
+    handler = asyncio.run(scenario())
+    assert handler.turns == [("c1", ["first"], ["s1"]), ("c1", ["second", "third"], ["s1", "s2"])]
+
+
+def test_batches_are_capped():
+    async def scenario():
+        handler = Recorder()
+        queue = ConversationQueue(handler, coalesce_window=0.01, max_batch=2)
+        for message in "abcde":
+            queue.submit("c1", message, "s")
+        await _drain(queue)
+        return handler
+
+    handler = asyncio.run(scenario())
+    assert [messages for _, messages, _ in handler.turns] == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_pending_messages_are_capped():
+    async def scenario():
+        handler = Recorder()
+        queue = ConversationQueue(handler, coalesce_window=0.05, max_pending=2)
+        accepted = [queue.submit("c1", message, "s") for message in "abc"]
+        other = queue.submit("c2", "x", "s")
+        await _drain(queue)
+        # Room again once the queue drained
+        again = queue.submit("c1", "d", "s")
+        await _drain(queue)
+        return handler, queue, accepted, other, again
+
+    handler, queue, accepted, other, again = asyncio.run(scenario())
+    assert accepted == [True, True, False]
+    assert other and again
+    assert ("c1", ["a", "b"], ["s"]) in handler.turns
+    assert queue.stats()["rejected_messages"] == 1
+
+
+def test_handler_errors_dont_stop_the_worker():
+    async def scenario():
+        calls = []
+
+        async def handler(conversation_id, messages, targets):
+            calls.append(messages)
+            if len(calls) == 1:
+                await asyncio.sleep(0.05)
+                raise RuntimeError("boom")
+
+        queue = ConversationQueue(handler, coalesce_window=0.01)
+        queue.submit("c1", "a", "s")
+        await asyncio.sleep(0.03)
+        queue.submit("c1", "b", "s")
+        await _drain(queue)
+        return calls, queue
+
+    calls, queue = asyncio.run(scenario())
+    assert calls == [["a"], ["b"]]
+    assert queue.stats()["handler_errors"] == 1
+
+
+def test_on_wait_gets_every_message():
+    async def scenario():
+        waits = []
+        queue = ConversationQueue(Recorder(), coalesce_window=0.05, on_wait=waits.append)
+        queue.submit("c1", "a", "s")
+        queue.submit("c1", "b", "s")
+        await _drain(queue)
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert len(waits) == 2
+    assert all(wait >= 0.04 for wait in waits)
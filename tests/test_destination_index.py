@@ -0,0 +1,82 @@
+import pytest
+
+import catalog
+from destination_index import DESTINATION_ALIASES, GROUP_ALIASES, THEME_ALIASES, NameIndex, normalize
+
+NAMES = {"Porto": 1, "Porto Santo": 2, "Paris": 3, "Barcelona": 4, "Kraków": 5, "Chania, Crete ": 6}
+
+
+@pytest.fixture
+def index():
+    return NameIndex(NAMES, {"Oporto": "Porto", "Gone": "Atlantis"})
+
+
+def test_normalize():
+    assert normalize(" Kraków ") == "krakow"
+    assert normalize("Chania, Crete ") == "chania crete"
+
+
+@pytest.mark.parametrize("name, value", [
+    ("Paris", 3),
+    ("Chania, Crete", 6),
+    ("  PARIS ", 3),
+    ("krakow", 5),
+    ("chania crete", 6),
+    ("Oporto", 1),
+    ("oporto", 1),
+])
+def test_exact_lookup(index, name, value):
+    match = index.resolve(name)
+    assert match.value == value
+    assert match.score == 1.0
+
+
+def test_alias_to_a_missing_name_is_ignored(index):
+    assert index.lookup("Gone") is None
+
+
+def test_alias_spelled_like_a_catalog_name_is_rejected():
+    with pytest.raises(AssertionError):
+        NameIndex(NAMES, {"paris": "Porto"})
+
+
+def test_fuzzy_match_above_threshold(index):
+    match = index.resolve("Barcelonna")
+    assert match.name == "Barcelona"
+    assert 0.75 <= match.score < 1.0
+
+
+def test_fuzzy_match_below_threshold(index):
+    # Paros is another island, not a typo of Paris
+    assert index.resolve("Paros") is None
+    assert index.resolve("Tokyo") is None
+
+
+def test_fuzzy_match_needs_a_lead():
+    # "Porto Sant" scores 0.91 for Porto Santo and 0.71 for Porto
+    assert NameIndex(NAMES).resolve("Porto Sant").value == 2
+    assert NameIndex(NAMES, min_score=0.6, min_lead=0.25).resolve("Porto Sant") is None
+
+
+def test_non_string_names(index):
+    assert index.resolve(None) is None
+    assert index.resolve(162) is None
+
+
+def test_builtin_catalog_aliases():
+    current = catalog.current()
+    assert current.destinations.resolve("Athen").name == "Athens"
+    assert current.destinations.resolve("Athens").name == "Athens"
+    assert current.destinations.resolve("Lisboa").name == "Lisbon"
+    assert current.groups.resolve("UAE").name == "United Arab Emirates"
+    assert current.themes.resolve("City breaks").name == "All city trips"
+
+
+@pytest.mark.parametrize("aliases, names", [
+    (DESTINATION_ALIASES, "destination_ids"),
+    (GROUP_ALIASES, "group_ids"),
+    (THEME_ALIASES, "theme_ids"),
+])
+def test_builtin_aliases_point_to_catalog_names(aliases, names):
+    catalog_names = getattr(catalog.current(), names)
+    assert [name for name in aliases.values() if name not in catalog_names] == []
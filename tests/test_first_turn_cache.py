@@ -0,0 +1,89 @@
+"""
+The first-turn response cache against the fake OpenAI API, across worker processes.
+
+Three workers share one conversation store and cache file, one after the other. The
+first answers a client's opening message (a miss, the reply is cached), the second
+answers the same opening message for another client from the cache, and the third
+gets that client's follow-up. Its new thread has to start with the cached exchange
+the second worker answered.
+"""
+import os
+import sys
+import json
+import subprocess
+
+# Workers run this file as a script, without the conftest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+OPENING = "Hello, what can you do?"
+FOLLOW_UP = "Thanks!"
+
+
+def worker(steps):
+    """
+    Run the given (client_id, message) steps against an in-process bot, print what happened as JSON
+    """
+    from fastapi.testclient import TestClient
+    import bot
+
+    results = []
+    with TestClient(bot.app) as client:
+        for client_id, message in steps:
+            with client.websocket_connect(f"/ws/{client_id}") as ws:
+                ws.send_text(message)
+                while True:
+                    frame = ws.receive_json()
+                    if frame["type"] in ("end", "error"):
+                        break
+            session = bot.conversations.get(client_id)
+            thread = bot.client.threads.get(session.thread_id, []) if session else []
+            results.append({
+                "client_id": client_id,
+                "message": message,
+                "reply": frame["text"],
+                "thread": [(item.role, item.content[0].text.value) for item in thread]
+            })
+        stats = client.get("/stats").json()
+    print(json.dumps({"results": results, "response_cache": stats["response_cache"], "turns": stats["turns"]}))
+
+
+def run_worker(env, steps):
+    # Run as a script in its own process, each worker imports bot with its own settings
+    output = subprocess.run(
+        [sys.executable, __file__, "--worker", json.dumps(steps)],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_cached_exchange_seeds_the_thread_on_another_worker(tmp_path):
+    env = {
+        **os.environ,
+        "USE_FAKE_OPENAI": "1",
+        "STREAM_RESPONSES": "1",
+        "RESPONSE_CACHE_ENABLED": "1",
+        "RESPONSE_CACHE_PATH": str(tmp_path / "responses.sqlite3"),
+        "CONVERSATION_STORE": "sqlite",
+        "CONVERSATION_STORE_PATH": str(tmp_path / "conversations.sqlite3"),
+        "SEARCH_RESULTS_PATH": str(tmp_path / "results.sqlite3")
+    }
+
+    first = run_worker(env, [["alice", OPENING]])
+    second = run_worker(env, [["bob", OPENING]])
+    follow_up = run_worker(env, [["bob", FOLLOW_UP]])
+    miss, hit, continued = first["results"][0], second["results"][0], follow_up["results"][0]
+
+    assert first["response_cache"]["misses"] == 1 and first["turns"]["turns"] == 1
+    # Answered from the cache, without an assistant turn
+    assert second["response_cache"]["hits"] == 1 and second["turns"]["turns"] == 0
+    assert hit["reply"] == miss["reply"]
+    # The third worker never saw the exchange, it comes from the shared conversation store
+    assert continued["thread"] == [
+        ["user", OPENING], ["assistant", hit["reply"]],
+        ["user", FOLLOW_UP], ["assistant", continued["reply"]]
+    ]
+
+
+if __name__ == "__main__":
+    worker(json.loads(sys.argv[2]))
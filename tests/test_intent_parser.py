@@ -0,0 +1,53 @@
+import pytest
+
+from classes.IntentParser import IntentParser
+
+
+@pytest.fixture
+def parser():
+    return IntentParser()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Paris, 4 stars, July, 2 adults, 7 nights", {
+        "destination_names": ["Paris"], "stars": [4], "travelMonth": [7], "number_of_nights": [7],
+        "adults_children_capacity": {"number_of_adults": 2}
+    }),
+    ("paris in may", {"destination_names": ["Paris"], "travelMonth": [5]}),
+    ("rome up to 400 euros", {"destination_names": ["Rome"], "max_price_per_person": 400}),
+    ("Beach holidays in Spain", {"destination_theme_names": ["Beach holidays"], "destination_group_names": ["Spain"]}),
+    ("Rome, Budget, July", {"destination_names": ["Rome"], "destination_theme_names": ["Budget friendly cities"], "travelMonth": [7]}),
+    ("paris, Nice, 2 adults", {"destination_names": ["Paris", "Nice"], "adults_children_capacity": {"number_of_adults": 2}}),
+    ("all inclusive in Crete", {"room_board_type": ["all inclusive"], "destination_names": ["Crete"]}),
+])
+def test_accepts_search_criteria(parser, text, expected):
+    assert parser.parse(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    # Names that are also ordinary words
+    "nice hotels in paris",
+    "Nice hotels in Paris",
+    "budget hotels in rome",
+    "beach hotels in spain",
+    "romantic hotels in venice",
+    "a Nice trip to paris",
+    # "may" and "mar" are only months after "in"
+    "I may go to paris",
+    # Anything that isn't search criteria
+    "What is the weather in Paris?",
+    "Hello, what can you do?",
+    "4 stars, July",
+    "Paris, 9 stars",
+])
+def test_leaves_other_messages_to_the_assistant(parser, text):
+    assert parser.parse(text) is None
+
+
+def test_stats(parser):
+    parser.parse("Paris, July")
+    parser.parse("nice hotels in paris")
+    stats = parser.stats()
+    assert stats["messages"] == 2
+    assert stats["hits"] == 1
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,77 @@
+import json
+import asyncio
+
+import pytest
+
+from classes.JsonStream import JsonArrayStream
+
+DOCUMENT = {
+    "total": 3,
+    "offers": [
+        {"hotel": "Hôtel Étoile", "price": 12.5e3, "tags": ["a\"b", "c,d]"], "nested": {"x": [1, 2]}},
+        {"hotel": "Casa 🌊", "price": -7, "rating": 4.5, "empty": {}},
+        12345
+    ],
+    "page": {"next": None, "flag": True}
+}
+
+
+async def _collect(parser, chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+    return [item async for item in parser.items(source())]
+
+
+def _parse(data: bytes, size: int, **kwargs):
+    parser = JsonArrayStream(**kwargs)
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    return asyncio.run(_collect(parser, chunks)), parser.meta
+
+
+@pytest.mark.parametrize("size", range(1, 24))
+def test_items_survive_every_chunk_size(size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    items, meta = _parse(data, size)
+    assert items == DOCUMENT["offers"]
+    assert meta == {"total": 3, "page": DOCUMENT["page"]}
+
+
+def test_every_split_point():
+    # Cuts inside multi-byte characters, escapes and numbers
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    for cut in range(1, len(data)):
+        parser = JsonArrayStream()
+        items = asyncio.run(_collect(parser, [data[:cut], data[cut:]]))
+        assert items == DOCUMENT["offers"], cut
+
+
+def test_bare_array():
+    items, meta = _parse(b' [1, 2.5, "x", {"a": [3]}] ', 2)
+    assert items == [1, 2.5, "x", {"a": [3]}]
+    assert meta == {}
+
+
+def test_empty_array_and_object():
+    assert _parse(b"[]", 1)[0] == []
+    assert _parse(b"{}", 1) == ([], {})
+    assert _parse(b'{"offers": [], "total": 0}', 3) == ([], {"total": 0})
+
+
+def test_only_the_first_matching_key_is_streamed():
+    data = b'{"results": [1, 2], "data": [3]}'
+    items, meta = _parse(data, 4)
+    assert items == [1, 2]
+    assert meta == {"data": [3]}
+
+
+def test_custom_keys():
+    items, meta = _parse(b'{"offers": [1], "hotels": [2, 3]}', 5, keys=("hotels",))
+    assert items == [2, 3]
+    assert meta == {"offers": [1]}
+
+
+@pytest.mark.parametrize("data", [b'{"offers": [1, 2', b'{"offers": [{"a": 1}', b'"text"'])
+def test_truncated_or_invalid_documents_raise(data):
+    with pytest.raises(ValueError):
+        _parse(data, 3)
@@ -0,0 +1,111 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from classes.RunPoller import RunPoller
+
+
+def _rate_limit_error(headers):
+    request = httpx.Request("GET", "https://api.openai.com/v1/threads/t/runs/r")
+    response = httpx.Response(429, headers=headers, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class FakeRuns:
+    """
+    Answers retrieve from a per-run script of statuses (or exceptions to raise), recording when each poll happened
+    """
+
+    def __init__(self, scripts):
+        self.scripts = {run_id: list(script) for run_id, script in scripts.items()}
+        self.polls = {run_id: [] for run_id in scripts}
+
+    async def retrieve(self, thread_id, run_id):
+        self.polls[run_id].append(time.monotonic())
+        step = self.scripts[run_id].pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return SimpleNamespace(id=run_id, thread_id=thread_id, status=step)
+
+
+def _poller(scripts, **kwargs):
+    runs = FakeRuns(scripts)
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    return RunPoller(client, **kwargs), runs
+
+
+def _gaps(times):
+    return [later - earlier for earlier, later in zip(times, times[1:])]
+
+
+def test_returns_the_first_state_that_needs_attention():
+    async def scenario():
+        poller, runs = _poller({"r1": ["queued", "in_progress", "requires_action"]}, min_interval=0.01)
+        polls = []
+        run = await poller.wait("t1", "r1", on_poll=lambda: polls.append(1))
+        return poller, run, polls
+
+    poller, run, polls = asyncio.run(scenario())
+    assert run.status == "requires_action"
+    assert len(polls) == 3
+    stats = poller.stats()
+    assert stats["polls_total"] == 3
+    assert stats["runs_finished"] == 1
+    assert stats["in_flight_runs"] == 0
+
+
+def test_backs_off_up_to_max_interval():
+    async def scenario():
+        poller, runs = _poller({"r1": ["queued"] * 5 + ["completed"]}, min_interval=0.02, max_interval=0.08, backoff=2)
+        started = time.monotonic()
+        await poller.wait("t1", "r1")
+        return [runs.polls["r1"][0] - started] + _gaps(runs.polls["r1"])
+
+    gaps = asyncio.run(scenario())
+    expected = [0.02, 0.04, 0.08, 0.08, 0.08, 0.08]
+    for gap, interval in zip(gaps, expected):
+        assert gap >= interval * 0.9
+    # Capped: the later gaps don't keep growing
+    assert max(gaps[3:]) < 0.16
+
+
+def test_rate_limit_pauses_every_run():
+    async def scenario():
+        poller, runs = _poller({
+            "r1": [_rate_limit_error({"retry-after-ms": "200"}), "completed"],
+            "r2": ["queued", "completed"]
+        }, min_interval=0.01, max_interval=0.02)
+        await asyncio.gather(poller.wait("t1", "r1"), poller.wait("t2", "r2"))
+        return poller, runs
+
+    poller, runs = asyncio.run(scenario())
+    paused_at = runs.polls["r1"][0]
+    assert runs.polls["r1"][1] - paused_at >= 0.18
+    # r2's second poll waited for the pause too
+    assert runs.polls["r2"][1] - paused_at >= 0.18
+    assert poller.stats()["rate_limited"] == 1
+
+
+@pytest.mark.parametrize("headers, delay", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "2"}, 2.0),
+    ({"retry-after": "soon"}, None),
+    ({}, None),
+])
+def test_retry_after(headers, delay):
+    assert RunPoller._retry_after(_rate_limit_error(headers)) == delay
+
+
+def test_other_errors_reach_the_caller():
+    async def scenario():
+        poller, runs = _poller({"r1": [RuntimeError("connection reset")]}, min_interval=0.01)
+        with pytest.raises(RuntimeError):
+            await poller.wait("t1", "r1")
+        return poller
+
+    poller = asyncio.run(scenario())
+    assert poller.stats()["poll_errors"] == 1
@@ -0,0 +1,64 @@
+import pytest
+
+from classes.TurnCounter import TurnBudgetExceeded, TurnCounter, TurnStats
+
+
+def test_counts_calls_by_name():
+    turn = TurnCounter()
+    turn.count("runs.create")
+    turn.count("runs.retrieve", enforce=False)
+    turn.count("runs.retrieve", enforce=False)
+    assert turn.total == 3
+    assert turn.calls == {"runs.create": 1, "runs.retrieve": 2}
+
+
+def test_no_budget_never_refuses():
+    turn = TurnCounter()
+    for _ in range(100):
+        turn.count("runs.create")
+    assert turn.total == 100
+
+
+def test_budget_refuses_new_work():
+    turn = TurnCounter(budget=2)
+    turn.count("threads.create_and_run")
+    turn.count("runs.submit_tool_outputs")
+    with pytest.raises(TurnBudgetExceeded):
+        turn.count("runs.submit_tool_outputs")
+    # The refused call is not counted
+    assert turn.total == 2
+
+
+def test_unenforced_calls_go_over_the_budget():
+    # Polls use up the budget, the reply of the completed run is still read
+    turn = TurnCounter(budget=3)
+    turn.count("threads.create_and_run")
+    turn.count("runs.retrieve", enforce=False)
+    turn.count("runs.retrieve", enforce=False)
+    turn.count("messages.list", enforce=False)
+    assert turn.total == 4
+    with pytest.raises(TurnBudgetExceeded):
+        turn.count("runs.create")
+
+
+def test_stats_count_turns_over_the_budget():
+    stats = TurnStats(budget=2)
+
+    at_budget = stats.start()
+    at_budget.count("runs.create")
+    at_budget.count("messages.list")
+    stats.finish(at_budget)
+
+    over_budget = stats.start()
+    over_budget.count("runs.create")
+    over_budget.count("runs.retrieve", enforce=False)
+    over_budget.count("messages.list", enforce=False)
+    stats.finish(over_budget)
+
+    result = stats.stats()
+    assert result["turns"] == 2
+    assert result["api_calls"] == 5
+    assert result["api_calls_per_turn"] == 2.5
+    assert result["max_api_calls_per_turn"] == 3
+    assert result["api_calls_by_name"] == {"runs.create": 2, "messages.list": 2, "runs.retrieve": 1}
+    assert result["turns_over_budget"] == 1